@@ -0,0 +1,122 @@
+"""
+Batch benchmark generation over biokg_data/{simple,medium,hard}.json.
+
+Every workflow goes through three stages: LLM planning -> tool execution -> final-benchmark
+LLM call. Each stage has its own concurrency limit, so while some workflows run their
+synthesis tools others are already being planned or written up. Finished records are
+appended to RESULTS_PATH as they complete; re-running skips workflows already in it.
+
+    python batch_generate.py
+"""
+import asyncio
+import json
+import time
+import traceback
+from typing import Dict, Iterator, List, Tuple
+
+from biogen_wf import BioDataForgeAgent
+from tools.results_jsonl import ResultsWriter, read_done_ids
+from tools.workspace import Workspace
+
+DATA_FILES = {
+    "simple": "./biokg_data/simple.json",
+    "medium": "./biokg_data/medium.json",
+    "hard": "./biokg_data/hard.json",
+}
+RESULTS_PATH = "./results/benchmarks.jsonl"
+
+PLAN_CONCURRENCY = 8        # concurrent planning LLM calls
+EXEC_CONCURRENCY = 4        # concurrent plan executions, each in its own ./workspace/<task_id>
+BENCHMARK_CONCURRENCY = 8   # concurrent final-benchmark LLM calls
+STEP_WORKERS = 4            # parallel synthesis steps inside one plan (execute_plan max_workers)
+WORKSPACE_CLEANUP = "scratch"  # see tools.workspace.Workspace
+
+
+def simple_to_sequence(entry: Dict[str, str]) -> List[Dict[str, str]]:
+    """simple.json stores a (target, downstream) pair as one flat dict; turn it into a tool list."""
+    target = {
+        "name": entry["target_tool_name"],
+        "desc": entry["target_tool_desc"],
+        "version": entry["target_tool_version"],
+        "cmd_template": entry["target_tool_cmd_template"],
+        "input_type": entry["target_input_type"],
+    }
+    downstream = {
+        "name": entry["downstream_tool_name"],
+        "desc": entry["downstream_tool_desc"],
+        "version": entry["downstream_tool_version"],
+        "cmd_template": entry["downstream_tool_cmd_template"],
+    }
+    if "downstream_input_type" in entry:
+        downstream["input_type"] = entry["downstream_input_type"]
+    return [target, downstream]
+
+
+def load_workflows(data_files: Dict[str, str] = DATA_FILES) -> Iterator[Tuple[str, str, List[Dict]]]:
+    """Yields (task_id, level, tools_sequence) for every workflow in the complexity files."""
+    for level, path in data_files.items():
+        with open(path, "r") as f:
+            entries = json.load(f)
+        for i, entry in enumerate(entries):
+            sequence = simple_to_sequence(entry) if isinstance(entry, dict) else entry
+            yield f"{level}-{i}", level, sequence
+
+
+async def run_batch(
+    agent: BioDataForgeAgent,
+    workflows: List[Tuple[str, str, List[Dict]]],
+    results_path: str = RESULTS_PATH,
+) -> Dict[str, int]:
+    """Generates every workflow not yet in `results_path`. Failed workflows are reported and skipped."""
+    done = read_done_ids(results_path)
+    todo = [w for w in workflows if w[0] not in done]
+    print(f"{len(todo)} workflows to generate ({len(done)} already in {results_path})")
+
+    plan_sem = asyncio.Semaphore(PLAN_CONCURRENCY)
+    exec_sem = asyncio.Semaphore(EXEC_CONCURRENCY)
+    bench_sem = asyncio.Semaphore(BENCHMARK_CONCURRENCY)
+    counts = {"generated": 0, "failed": 0}
+
+    with ResultsWriter(results_path) as out:
+        async def generate(task_id: str, level: str, tools_sequence: List[Dict]):
+            timings = {}
+            try:
+                async with plan_sem:
+                    start = time.perf_counter()
+                    plan = await agent.acreate_plan(tools_sequence)
+                    timings["plan"] = time.perf_counter() - start
+                async with exec_sem:
+                    start = time.perf_counter()
+                    with Workspace(task_id, cleanup=WORKSPACE_CLEANUP):
+                        executed_plan = await asyncio.to_thread(agent.execute_plan, plan, STEP_WORKERS)
+                    timings["execute"] = time.perf_counter() - start
+                async with bench_sem:
+                    start = time.perf_counter()
+                    benchmark = await agent.agenerate_final_benchmark(executed_plan, tools_sequence)
+                    timings["benchmark"] = time.perf_counter() - start
+            except Exception as e:
+                print(f"❌ [{task_id}] {type(e).__name__}: {e}")
+                traceback.print_exc()
+                counts["failed"] += 1
+                return
+            record = {
+                "id": task_id,
+                "level": level,
+                "workflow_tools": tools_sequence,
+                "plan": executed_plan.model_dump(),
+                "benchmark": benchmark.model_dump(),
+                "timings": timings,
+            }
+            out.append(record)
+            counts["generated"] += 1
+            print(f"✅ [{task_id}] done ({counts['generated']}/{len(todo)})")
+
+        await asyncio.gather(*(generate(*w) for w in todo))
+    return counts
+
+
+if __name__ == "__main__":
+    agent = BioDataForgeAgent()
+    start = time.perf_counter()
+    counts = asyncio.run(run_batch(agent, list(load_workflows())))
+    print(f"Generated {counts['generated']} benchmarks, {counts['failed']} failed, in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,120 @@
+"""
+Micro-benchmarks for the synthesis tools. Run from BioGen/.
+
+    python bench_tools.py runner [env] [n_calls] [program args...]
+    python bench_tools.py call_variants <sorted.bam> <reference.fa> [shard counts...]
+    python bench_tools.py insilicoseq <genome_list.txt> [total_reads] [shard counts...]
+    python bench_tools.py art <transcripts.fa> [fold coverage] [worker counts...]
+"""
+import os
+import subprocess
+import sys
+import time
+
+from tools import runner
+
+
+def bench_runner(env_name: str = "bio_agent_env", n_calls: int = 10, cmd=("samtools", "--version")):
+    """Per-invocation cost of `conda run -n <env> <cmd>` vs. the cached tools.runner lookup."""
+    cmd = list(cmd)
+    conda = runner._conda_exe()
+
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        subprocess.run([conda, "run", "-n", env_name, *cmd], capture_output=True, check=True)
+    conda_run = (time.perf_counter() - start) / n_calls
+
+    start = time.perf_counter()
+    runner.conda_environ(env_name)
+    runner.resolve(env_name, cmd[0])
+    resolve_once = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(n_calls):
+        runner.run(env_name, cmd, capture_output=True, check=True)
+    direct = (time.perf_counter() - start) / n_calls
+
+    print(f"conda run      : {conda_run * 1000:8.1f} ms/call")
+    print(f"tools.runner   : {direct * 1000:8.1f} ms/call (+{resolve_once * 1000:.0f} ms once per env)")
+    print(f"speedup        : {conda_run / direct:8.1f}x")
+
+
+def bench_call_variants(sorted_bam: str, reference_fasta: str, shard_counts=None):
+    """Wall time of call_variants_bcftools per shard count, checking records match the serial run."""
+    from tools.variomics_tools import call_variants_bcftools
+    from tools.workspace import Workspace
+
+    cores = os.cpu_count() or 1
+    shard_counts = shard_counts or sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    serial_records = None
+    serial_time = None
+    for shards in shard_counts:
+        with Workspace(f"bench-call-{shards}", cleanup="all"):
+            start = time.perf_counter()
+            vcf = call_variants_bcftools.func(sorted_bam, reference_fasta, shards=shards)
+            elapsed = time.perf_counter() - start
+            records = runner.run("bio_agent_env", ["bcftools", "view", "-H", vcf], capture_output=True, check=True).stdout
+        if shards == 1:
+            serial_records, serial_time = records, elapsed
+        same = "n/a" if serial_records is None else ("identical" if records == serial_records else "DIFFERENT")
+        speedup = f"{serial_time / elapsed:5.2f}x" if serial_time else "  n/a"
+        print(f"shards={shards:3d}  {elapsed:8.2f} s  speedup {speedup}  records {same}")
+
+
+def bench_insilicoseq(genome_list_file: str, total_reads: int = 1_000_000, shard_counts=None):
+    """Read-pair throughput of simulate_metagenome_insilicoseq per shard (worker) count."""
+    from tools.metagenomics_tools import simulate_metagenome_insilicoseq
+    from tools.workspace import Workspace
+
+    cores = os.cpu_count() or 1
+    shard_counts = shard_counts or sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    serial_time = None
+    for shards in shard_counts:
+        with Workspace(f"bench-iss-{shards}", cleanup="all"):
+            start = time.perf_counter()
+            simulate_metagenome_insilicoseq.func(genome_list_file, total_reads=total_reads, shards=shards)
+            elapsed = time.perf_counter() - start
+        if shards == 1:
+            serial_time = elapsed
+        speedup = f"{serial_time / elapsed:5.2f}x" if serial_time else "  n/a"
+        print(f"shards={shards:3d}  {elapsed:8.2f} s  {total_reads / 2 / elapsed:12,.0f} pairs/s  speedup {speedup}")
+
+
+def bench_art(transcriptome_fasta: str, fold: int = 50, worker_counts=None):
+    """Wall time of simulate_rna_seq_reads_art (without .aln output) per worker count."""
+    from tools.transcriptomics_tools import simulate_rna_seq_reads_art
+    from tools.workspace import Workspace
+
+    cores = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    serial_time = None
+    for workers in worker_counts:
+        with Workspace(f"bench-art-{workers}", cleanup="all"):
+            start = time.perf_counter()
+            r1, _ = simulate_rna_seq_reads_art.func(transcriptome_fasta, num_reads_per_transcript=fold, workers=workers)
+            elapsed = time.perf_counter() - start
+            with open(r1, "rb") as f:
+                pairs = sum(1 for _ in f) // 4
+        if workers == 1:
+            serial_time = elapsed
+        speedup = f"{serial_time / elapsed:5.2f}x" if serial_time else "  n/a"
+        print(f"workers={workers:3d}  {elapsed:8.2f} s  {pairs / elapsed:12,.0f} pairs/s  speedup {speedup}")
+
+
+if __name__ == "__main__":
+    bench = sys.argv[1] if len(sys.argv) > 1 else "runner"
+    if bench == "runner":
+        env_name = sys.argv[2] if len(sys.argv) > 2 else "bio_agent_env"
+        n_calls = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+        cmd = sys.argv[4:] or ("samtools", "--version")
+        bench_runner(env_name, n_calls, cmd)
+    elif bench == "call_variants":
+        bench_call_variants(sys.argv[2], sys.argv[3], [int(n) for n in sys.argv[4:]] or None)
+    elif bench == "insilicoseq":
+        total_reads = int(sys.argv[3]) if len(sys.argv) > 3 else 1_000_000
+        bench_insilicoseq(sys.argv[2], total_reads, [int(n) for n in sys.argv[4:]] or None)
+    elif bench == "art":
+        fold = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+        bench_art(sys.argv[2], fold, [int(n) for n in sys.argv[4:]] or None)
+    else:
+        raise SystemExit(f"unknown benchmark: {bench}")
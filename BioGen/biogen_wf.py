@@ -1,8 +1,11 @@
 import os
 import json
 import re
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from typing import List, Dict, Any, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
@@ -14,6 +17,11 @@ from tools.variomics_tools import align_reads_bwa, call_variants_bcftools, simul
 from tools.proteomics_tools import simulate_ms_spectra_pyopenms
 from tools.metagenomics_tools import simulate_metagenome_insilicoseq, create_genome_list_file
 from tools.metabolomics_tools import simulate_metabolomics_peak_list
+from tools.artifact_cache import ArtifactCache
+from tools.workspace import current_workspace
+
+# Reuse outputs of identical tool calls (same inputs, input file contents and tool version)
+USE_ARTIFACT_CACHE = True
 
 
 class TaskStep(BaseModel):
@@ -27,6 +35,17 @@ class WorkflowPlan(BaseModel):
     synthesis_steps: List[TaskStep] = Field(description="Steps to generate input files for the FIRST tool in the workflow sequence.")
     workflow_execution_logic: str = Field(description="A textual description or template of how the Target Workflow (Tools 1 to N-1) should be executed sequentially, creating intermediate files.")
     validation_run_command: str = Field(description="The command template for the LAST tool (Validation Tool) which takes the final output of the workflow as input.")
+    # filled in by execute_plan; private, so they stay out of the LLM output schema
+    _step_timings: Dict[int, Dict[str, Any]] = PrivateAttr(default_factory=dict)
+    _step_dependencies: Dict[int, set] = PrivateAttr(default_factory=dict)
+
+    @property
+    def step_timings(self) -> Dict[int, Dict[str, Any]]:
+        return self._step_timings
+
+    @property
+    def step_dependencies(self) -> Dict[int, set]:
+        return self._step_dependencies
 
 class BenchmarkOutput(BaseModel):
     user_query: str = Field(description="The natural language request asking the agent to run the sequential workflow (excluding the validation tool).")
@@ -59,6 +78,9 @@ class BioDataForgeAgent:
             "create_genome_list_file": create_genome_list_file,
             "simulate_metabolomics_peak_list": simulate_metabolomics_peak_list,
         }
+        self.artifact_cache = ArtifactCache() if USE_ARTIFACT_CACHE else None
+        if self.artifact_cache is not None:
+            self.tool_functions = self.artifact_cache.wrap(self.tool_functions)
 
         self.parser = PydanticOutputParser(pydantic_object=WorkflowPlan)
         self.benchmark_parser = PydanticOutputParser(pydantic_object=BenchmarkOutput)
@@ -264,12 +286,7 @@ class BioDataForgeAgent:
         ])
         return prompt.partial(format_instructions=self.benchmark_parser.get_format_instructions())
 
-    def create_plan(self, tools_sequence: List[Dict]) -> WorkflowPlan:
-        """
-        tools_sequence: A list of dicts, each describing a tool in order.
-        """
-        print("Generating a workflow plan for the tool sequence...")
-        
+    def _workflow_description(self, tools_sequence: List[Dict]) -> str:
         workflow_desc = ""
         for i, tool in enumerate(tools_sequence):
             role = "VALIDATION TOOL" if i == len(tools_sequence) - 1 else f"Step {i+1}"
@@ -277,12 +294,22 @@ class BioDataForgeAgent:
             workflow_desc += f"  - Description: {tool['desc']}\n"
             workflow_desc += f"  - Command: {tool['cmd_template']}\n"
             workflow_desc += f"  - Input Need: {tool.get('input_type', 'unknown')}\n"
+        return workflow_desc
 
+    def create_plan(self, tools_sequence: List[Dict]) -> WorkflowPlan:
+        """
+        tools_sequence: A list of dicts, each describing a tool in order.
+        """
+        print("Generating a workflow plan for the tool sequence...")
         chain = self.prompt | self.llm | self.parser
-        plan = chain.invoke({"workflow_description": workflow_desc})
+        plan = chain.invoke({"workflow_description": self._workflow_description(tools_sequence)})
         print("Plan generated successfully!")
         return plan
 
+    async def acreate_plan(self, tools_sequence: List[Dict]) -> WorkflowPlan:
+        chain = self.prompt | self.llm | self.parser
+        return await chain.ainvoke({"workflow_description": self._workflow_description(tools_sequence)})
+
     def _resolve_input_value(self, value, step_outputs):
         if isinstance(value, str):
             match_index = re.match(r"^\$output_of_step_(\d+)\[(\d+)\]$", value)
@@ -299,33 +326,125 @@ class BioDataForgeAgent:
             return {k: self._resolve_input_value(v, step_outputs) for k, v in value.items()}
         return value
 
-    def execute_plan(self, plan: WorkflowPlan) -> WorkflowPlan:
+    def _step_dependencies(self, value) -> set:
+        """Step ids referenced through $output_of_step_X / $output_of_step_X[i] anywhere in `value`."""
+        if isinstance(value, str):
+            match = re.match(r"^\$output_of_step_(\d+)(?:\[\d+\])?$", value)
+            return {int(match.group(1))} if match else set()
+        elif isinstance(value, list):
+            return set().union(*(self._step_dependencies(item) for item in value))
+        elif isinstance(value, dict):
+            return set().union(*(self._step_dependencies(v) for v in value.values()))
+        return set()
+
+    def _build_step_graph(self, steps: List[TaskStep]) -> Dict[int, set]:
+        ids = [step.step_id for step in steps]
+        duplicates = sorted({step_id for step_id in ids if ids.count(step_id) > 1})
+        if duplicates:
+            raise ValueError(f"Duplicate synthesis step id(s): {duplicates}")
+        deps = {step.step_id: self._step_dependencies(step.input) for step in steps}
+        for step_id, step_deps in deps.items():
+            missing = step_deps - deps.keys()
+            if missing:
+                raise ValueError(f"Step {step_id} references unknown step(s): {sorted(missing)}")
+        # Kahn's algorithm, only to reject cycles up front
+        remaining = {k: set(v) for k, v in deps.items()}
+        ready = [k for k, v in remaining.items() if not v]
+        while ready:
+            done = ready.pop()
+            for k, v in remaining.items():
+                if done in v:
+                    v.discard(done)
+                    if not v:
+                        ready.append(k)
+            remaining.pop(done)
+        if remaining:
+            raise ValueError(f"Synthesis steps have a dependency cycle: {sorted(remaining)}")
+        return deps
+
+    def _run_step(self, step: TaskStep, step_outputs: Dict[int, Any]):
+        print(f"  [Step {step.step_id}] Tool: {step.tool}")
+        resolved_inputs = {k: self._resolve_input_value(v, step_outputs) for k, v in step.input.items()}
+
+        tool_obj = self.tool_functions.get(step.tool)
+        if not tool_obj:
+            print(f"Warning: Tool {step.tool} function not found/mocked.")
+            return "/mock/path/result.file"
+        try:
+            output = tool_obj.func(**resolved_inputs)
+            print(f"Output: {output}")
+            return output
+        except Exception as e:
+            print(f"Error: {e}")
+            raise
+
+    def execute_plan(self, plan: WorkflowPlan, max_workers: int = 4) -> WorkflowPlan:
+        """
+        Runs the synthesis steps as a dependency graph: a step starts as soon as every step it
+        references through $output_of_step_X has finished, with up to `max_workers` steps in
+        parallel. The first failure cancels the steps not yet started and is re-raised.
+        Each step writes into its own sub-workspace (step_<id>/), so steps whose tools use the
+        same output file names cannot overwrite each other.
+        Per-step timings and dependencies are attached to the returned plan
+        (plan.step_timings / plan.step_dependencies, see critical_path()).
+        """
         print(f"--- Executing Synthesis Steps ---")
+        deps = self._build_step_graph(plan.synthesis_steps)
+        steps = {step.step_id: step for step in plan.synthesis_steps}
         step_outputs = {}
-        for step in plan.synthesis_steps:
-            print(f"  [Step {step.step_id}] Tool: {step.tool}")
-            resolved_inputs = {k: self._resolve_input_value(v, step_outputs) for k, v in step.input.items()}
-            
-            tool_obj = self.tool_functions.get(step.tool)
-            if not tool_obj:
-                print(f"Warning: Tool {step.tool} function not found/mocked.")
-                step.output = {"result": "/mock/path/result.file"} 
-                step_outputs[step.step_id] = "/mock/path/result.file"
-                continue
-                
+        timings = {}
+        plan_start = time.perf_counter()
+
+        def timed(step):
+            start = time.perf_counter() - plan_start
             try:
-                output = tool_obj.func(**resolved_inputs) 
-                step_outputs[step.step_id] = output
-                step.output = {"result": output}
-                print(f"Output: {output}")
-            except Exception as e:
-                print(f"Error: {e}")
-                raise
+                with current_workspace().step(f"step_{step.step_id}"):
+                    return self._run_step(step, step_outputs)
+            finally:
+                end = time.perf_counter() - plan_start
+                timings[step.step_id] = {"tool": step.tool, "start": start, "end": end, "duration": end - start}
+
+        pending = {step_id for step_id in steps}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while pending or running:
+                for step_id in sorted(pending):
+                    if deps[step_id] <= step_outputs.keys():
+                        # copy the context so tools see the caller's active Workspace
+                        running[pool.submit(contextvars.copy_context().run, timed, steps[step_id])] = step_id
+                        pending.discard(step_id)
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step_id = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for other in running:
+                            other.cancel()
+                        raise error
+                    step_outputs[step_id] = future.result()
+                    steps[step_id].output = {"result": step_outputs[step_id]}
+
+        total = time.perf_counter() - plan_start
+        # kept on the plan, not the agent, so several plans can be executed concurrently
+        plan._step_timings, plan._step_dependencies = timings, deps
+        path, length = self.critical_path(plan)
+        print(f"--- Synthesis finished in {total:.2f}s; critical path {path} ({length:.2f}s) ---")
         return plan
 
-    def generate_final_benchmark(self, executed_plan: WorkflowPlan, tools_sequence: List[Dict]) -> BenchmarkOutput:
-        print("\nGenerating Final Benchmark Case...")
-        
+    def critical_path(self, plan: WorkflowPlan):
+        """Longest chain of dependent steps by duration in a plan returned by execute_plan()."""
+        timings, deps = plan.step_timings, plan.step_dependencies
+        longest = {}
+
+        def visit(step_id):
+            if step_id not in longest:
+                best = max((visit(d) for d in deps[step_id]), key=lambda x: x[1], default=([], 0.0))
+                longest[step_id] = (best[0] + [step_id], best[1] + timings[step_id]["duration"])
+            return longest[step_id]
+
+        return max((visit(step_id) for step_id in timings), key=lambda x: x[1], default=([], 0.0))
+
+    def _benchmark_inputs(self, executed_plan: WorkflowPlan, tools_sequence: List[Dict]) -> Dict[str, str]:
         executed_steps_summary = []
         for step in executed_plan.synthesis_steps:
             executed_steps_summary.append({
@@ -333,15 +452,19 @@ class BioDataForgeAgent:
                 "tool": step.tool,
                 "actual_output": step.output
             })
+        return {
+            "workflow_info_str": json.dumps(tools_sequence, indent=2),
+            "executed_steps_json": json.dumps(executed_steps_summary, indent=2)
+        }
 
-        workflow_info_str = json.dumps(tools_sequence, indent=2)
+    def generate_final_benchmark(self, executed_plan: WorkflowPlan, tools_sequence: List[Dict]) -> BenchmarkOutput:
+        print("\nGenerating Final Benchmark Case...")
+        chain = self.benchmark_prompt | self.llm | self.benchmark_parser
+        return chain.invoke(self._benchmark_inputs(executed_plan, tools_sequence))
 
+    async def agenerate_final_benchmark(self, executed_plan: WorkflowPlan, tools_sequence: List[Dict]) -> BenchmarkOutput:
         chain = self.benchmark_prompt | self.llm | self.benchmark_parser
-        result = chain.invoke({
-            "workflow_info_str": workflow_info_str,
-            "executed_steps_json": json.dumps(executed_steps_summary, indent=2)
-        })
-        return result
+        return await chain.ainvoke(self._benchmark_inputs(executed_plan, tools_sequence))
 
 if __name__ == '__main__':
     agent = BioDataForgeAgent()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from tools.read_sim import mutate, read_fasta, simulate_pairs
+
+COMPLEMENT = bytes.maketrans(b"ACGTN", b"TGCAN")
+
+
+def as_bytes(codes: np.ndarray) -> bytes:
+    return np.frombuffer(b"ACGTN", dtype=np.uint8)[codes].tobytes()
+
+
+@pytest.fixture
+def reference(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / "ref.fa"
+    with open(path, "w") as f:
+        for name, length in (("chr1", 5000), ("chr2", 1200)):
+            seq = "".join(rng.choice(list("ACGT"), length))
+            f.write(f">{name} description\n")
+            f.writelines(seq[i:i + 60] + "\n" for i in range(0, length, 60))
+    return str(path)
+
+
+def read_fastq(path):
+    with open(path, "rb") as f:
+        lines = f.read().split(b"\n")
+    return [(lines[i][1:], lines[i + 1]) for i in range(0, len(lines) - 1, 4)]
+
+
+def apply_variants(ref: bytes, variants) -> bytes:
+    out, cursor = [], 0
+    for pos, ref_allele, alt_allele in variants:
+        out.append(ref[cursor:pos])
+        out.append(alt_allele)
+        cursor = pos + len(ref_allele)
+    out.append(ref[cursor:])
+    return b"".join(out)
+
+
+def test_truth_vcf_ref_alleles_match_reference(reference, tmp_path):
+    vcf = tmp_path / "truth.vcf"
+    simulate_pairs(reference, str(tmp_path / "r1.fq"), str(tmp_path / "r2.fq"), num_reads=10,
+                   mutation_rate=0.05, indel_fraction=0.3, truth_vcf=str(vcf))
+    genome = {name: as_bytes(seq) for name, seq in read_fasta(reference)}
+    records = [line.split("\t") for line in vcf.read_text().splitlines() if not line.startswith("#")]
+    assert len(records) > 100
+    for chrom, pos, _, ref_allele, alt_allele, *_ in records:
+        start = int(pos) - 1
+        assert genome[chrom][start:start + len(ref_allele)] == ref_allele.encode()
+        assert ref_allele != alt_allele
+    positions = [(chrom, int(pos)) for chrom, pos, *_ in records]
+    assert positions == sorted(positions, key=lambda p: (["chr1", "chr2"].index(p[0]), p[1]))
+
+
+def test_mutate_variants_reproduce_haplotype(reference):
+    _, ref = read_fasta(reference)[0]
+    haplotype, variants = mutate(np.random.default_rng(1), ref, 0.05, indel_fraction=0.3)
+    assert apply_variants(as_bytes(ref), variants) == as_bytes(haplotype)
+
+
+def test_reads_match_their_fragments(reference, tmp_path):
+    r1, r2 = str(tmp_path / "r1.fq"), str(tmp_path / "r2.fq")
+    simulate_pairs(reference, r1, r2, num_reads=500, mutation_rate=0.0, error_rate=0.0,
+                   read_length=50, outer_distance=200, std_dev=20, batch_size=128)
+    genome = {name: as_bytes(seq) for name, seq in read_fasta(reference)}
+    pairs = list(zip(read_fastq(r1), read_fastq(r2)))
+    assert len(pairs) == 500
+    for (name1, seq1), (name2, seq2) in pairs:
+        assert name1[:-2] == name2[:-2] and name1.endswith(b"/1") and name2.endswith(b"/2")
+        chrom, start, end, _ = name1[:-2].decode().rsplit("_", 3)
+        fragment = genome[chrom][int(start) - 1:int(end)]
+        forward, reverse = fragment[:50], fragment[-50:].translate(COMPLEMENT)[::-1]
+        assert {seq1, seq2} == {forward, reverse}
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import fcntl
+import shutil
+import sqlite3
+import sys
+import types
+import hashlib
+import inspect
+import tempfile
+import threading
+from typing import Any, Dict
+
+from tools.workspace import current_workspace
+
+ARTIFACT_CACHE_DIR = "./artifact_cache"
+ARTIFACT_CACHE_MAX_BYTES = 20 * 1024 ** 3
+# Bump a tool's entry when its external binary changes in a way that matters for the output
+TOOL_VERSIONS: Dict[str, str] = {}
+# Bump to invalidate every entry (e.g. after a change outside the tools package)
+CACHE_VERSION = "1"
+# Outputs that are not produced by the tool (seed paths) are not worth caching
+UNCACHED_TOOLS = {"get_seed_file_path"}
+
+_FICLONE = 0x40049409  # linux/fs.h
+
+
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _clone(src: str, dst: str):
+    """Copy-on-write clone (btrfs/xfs), falling back to a plain copy."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src, dst)
+
+
+class ArtifactCache:
+    """
+    Content-addressed store for synthesis tool outputs.
+
+    A tool call is keyed on (tool name, resolved inputs, SHA-256 of every input that is a
+    file, source of the tool's module and the tools.* helpers it uses, TOOL_VERSIONS and
+    CACHE_VERSION). Output files, their index sidecars (`.bai`, `.csi`,
+    `.fai`, ...) and any other file the call wrote to the workspace are stored once under
+    objects/<sha> and materialised into the active workspace by reflink or copy, never by
+    hardlink, so a tool rewriting its output cannot reach the stored blob. A blob whose size
+    or mtime changed is re-hashed before it is served. The store is kept under
+    `max_bytes` by evicting the least recently used entries.
+    """
+
+    def __init__(self, root: str = ARTIFACT_CACHE_DIR, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, tool TEXT, result TEXT, last_used REAL)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entry_blobs (key TEXT, sha TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS blobs (sha TEXT PRIMARY KEY, size INTEGER)")
+        # (size, mtime) of each blob when it was last hashed; a hit only re-hashes when they moved
+        self.db.execute("CREATE TABLE IF NOT EXISTS blob_stats (sha TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS file_hashes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha TEXT)")
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._source_hashes = {}
+
+    # --- keys ---------------------------------------------------------------------------
+
+    def file_digest(self, path: str) -> str:
+        """SHA-256 of a file, memoised on (path, size, mtime) so large seeds are hashed once."""
+        st = os.stat(path)
+        path = os.path.abspath(path)
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime_ns, sha FROM file_hashes WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        sha = sha256_file(path)
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", (path, st.st_size, st.st_mtime_ns, sha))
+        return sha
+
+    def _describe(self, value):
+        if isinstance(value, str) and os.path.isfile(value):
+            return {"file": self.file_digest(value)}
+        if isinstance(value, (list, tuple)):
+            return [self._describe(v) for v in value]
+        if isinstance(value, dict):
+            return {k: self._describe(v) for k, v in sorted(value.items())}
+        return value
+
+    @staticmethod
+    def _code_modules(func):
+        """The module defining `func` plus every tools.* module it reaches through its globals."""
+        seen = {}
+        stack = [sys.modules.get(getattr(func, "__module__", None))]
+        while stack:
+            module = stack.pop()
+            if module is None or module.__name__ in seen:
+                continue
+            seen[module.__name__] = module
+            for value in vars(module).values():
+                name = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, "__module__", None)
+                if isinstance(name, str) and name.startswith("tools.") and name != __name__:
+                    stack.append(sys.modules.get(name))
+        return [seen[name] for name in sorted(seen)]
+
+    def _code_hash(self, tool_name: str, func) -> str:
+        """Source of the tool's module and of the helpers it uses (runner, read_sim, fastq...)."""
+        if tool_name not in self._source_hashes:
+            h = hashlib.sha256(CACHE_VERSION.encode())
+            modules = self._code_modules(func)
+            for module in modules:
+                try:
+                    h.update(inspect.getsource(module).encode("utf-8"))
+                except (OSError, TypeError):
+                    h.update(module.__name__.encode())
+            if not modules:
+                h.update(getattr(func, "__qualname__", tool_name).encode())
+            self._source_hashes[tool_name] = h.hexdigest()
+        return self._source_hashes[tool_name]
+
+    def make_key(self, tool_name: str, func, inputs: Dict[str, Any]) -> str:
+        payload = {
+            "tool": tool_name,
+            "version": TOOL_VERSIONS.get(tool_name, ""),
+            "source": self._code_hash(tool_name, func),
+            "inputs": self._describe(inputs),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    # --- blobs --------------------------------------------------------------------------
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.objects_dir, sha[:2], sha)
+
+    def _ingest(self, path: str) -> str:
+        sha = sha256_file(path)
+        blob = self._blob_path(sha)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(blob))
+            os.close(fd)
+            _clone(path, tmp)
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, blob)
+        st = os.stat(blob)
+        with self.lock:
+            self.db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?)", (sha, st.st_size))
+            self.db.execute("INSERT OR REPLACE INTO blob_stats VALUES (?, ?, ?)", (sha, st.st_size, st.st_mtime_ns))
+        return sha
+
+    def _blob_ok(self, sha: str) -> bool:
+        """False if the blob is gone or no longer hashes to `sha` (re-hashed only when its stat changed)."""
+        blob = self._blob_path(sha)
+        try:
+            st = os.stat(blob)
+        except FileNotFoundError:
+            return False
+        with self.lock:
+            row = self.db.execute("SELECT size, mtime_ns FROM blob_stats WHERE sha = ?", (sha,)).fetchone()
+        if row == (st.st_size, st.st_mtime_ns):
+            return True
+        if sha256_file(blob) != sha:
+            return False
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO blob_stats VALUES (?, ?, ?)", (sha, st.st_size, st.st_mtime_ns))
+        return True
+
+    def _materialize(self, sha: str, dest: str):
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        if os.path.lexists(dest):
+            os.remove(dest)
+        _clone(self._blob_path(sha), dest)
+
+    @staticmethod
+    def _sidecars(path: str):
+        directory, name = os.path.split(path)
+        for entry in os.listdir(directory or "."):
+            if entry != name and entry.startswith(name + "."):
+                yield os.path.join(directory, entry)
+
+    # --- entries ------------------------------------------------------------------------
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.db.execute("SELECT result FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        stored = json.loads(row[0])
+        # a blob deleted or modified by hand invalidates the entry
+        if not all(self._blob_ok(sha) for sha in set(stored["files"].values())):
+            self._drop(key)
+            return None
+        workspace = current_workspace()
+        for name, sha in stored["files"].items():
+            self._materialize(sha, workspace.path(name))
+        with self.lock:
+            self.db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        names = stored["result"]
+        if stored["kind"] == "str":
+            return workspace.path(names)
+        paths = [workspace.path(name) for name in names]
+        return tuple(paths) if stored["kind"] == "tuple" else paths
+
+    @staticmethod
+    def snapshot() -> Dict[str, tuple]:
+        """(size, mtime) of every file in the active workspace, to find what a tool call wrote."""
+        workspace_dir = current_workspace().dir
+        stats = {}
+        if os.path.isdir(workspace_dir):
+            for entry in os.scandir(workspace_dir):
+                if entry.is_file():
+                    st = entry.stat()
+                    stats[entry.name] = (st.st_size, st.st_mtime_ns)
+        return stats
+
+    def put(self, key: str, tool_name: str, result, before: Dict[str, tuple] = None) -> bool:
+        """
+        Stores `result` if every returned path is a file in the active workspace, together with
+        every other workspace file the call created or changed (`before` is the snapshot() taken
+        before it ran), e.g. .trees, .aln or abundance files next to the returned outputs.
+        """
+        workspace_dir = os.path.abspath(current_workspace().dir)
+        if isinstance(result, str):
+            paths = [result]
+        elif isinstance(result, (list, tuple)) and result and all(isinstance(p, str) for p in result):
+            paths = list(result)
+        else:
+            return False
+        for path in paths:
+            if not os.path.isfile(path) or os.path.dirname(os.path.abspath(path)) != workspace_dir:
+                return False
+        files = {}
+        for path in paths:
+            for file_path in [path, *self._sidecars(path)]:
+                files[os.path.basename(file_path)] = self._ingest(file_path)
+        if before is not None:
+            for name, stat in self.snapshot().items():
+                if name not in files and before.get(name) != stat:
+                    files[name] = self._ingest(os.path.join(workspace_dir, name))
+        stored = {
+            "kind": type(result).__name__,
+            "result": os.path.basename(result) if isinstance(result, str) else [os.path.basename(p) for p in paths],
+            "files": files,
+        }
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, tool_name, json.dumps(stored), time.time()))
+            self.db.execute("DELETE FROM entry_blobs WHERE key = ?", (key,))
+            self.db.executemany("INSERT INTO entry_blobs VALUES (?, ?)", [(key, sha) for sha in set(files.values())])
+        self.evict()
+        return True
+
+    def _drop(self, key: str):
+        with self.lock:
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.db.execute("DELETE FROM entry_blobs WHERE key = ?", (key,))
+            orphans = [r[0] for r in self.db.execute(
+                "SELECT sha FROM blobs WHERE sha NOT IN (SELECT sha FROM entry_blobs)"
+            ).fetchall()]
+            self.db.executemany("DELETE FROM blobs WHERE sha = ?", [(sha,) for sha in orphans])
+            self.db.executemany("DELETE FROM blob_stats WHERE sha = ?", [(sha,) for sha in orphans])
+        for sha in orphans:
+            try:
+                os.remove(self._blob_path(sha))
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self):
+        """Drops least recently used entries until the store fits in max_bytes."""
+        while self.size > self.max_bytes:
+            with self.lock:
+                row = self.db.execute("SELECT key FROM entries ORDER BY last_used LIMIT 1").fetchone()
+            if row is None:
+                break
+            self._drop(row[0])
+
+    def close(self):
+        self.db.close()
+
+    # --- registry wrapper ---------------------------------------------------------------
+
+    def wrap(self, tool_functions: Dict[str, Any]) -> Dict[str, Any]:
+        """Returns a registry whose entries expose a memoised `.func`, like the @tool objects."""
+        return {
+            name: tool_obj if name in UNCACHED_TOOLS else CachedTool(self, name, tool_obj)
+            for name, tool_obj in tool_functions.items()
+        }
+
+
+class CachedTool:
+    def __init__(self, cache: ArtifactCache, name: str, tool_obj):
+        self.cache = cache
+        self.name = name
+        self.tool = tool_obj
+
+    def func(self, **inputs):
+        key = self.cache.make_key(self.name, self.tool.func, inputs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache.hits += 1
+            print(f"♻️  {self.name}: reused cached artifacts")
+            return cached
+        self.cache.misses += 1
+        before = self.cache.snapshot()
+        result = self.tool.func(**inputs)
+        self.cache.put(key, self.name, result, before)
+        return result
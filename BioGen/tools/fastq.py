@@ -0,0 +1,48 @@
+import os
+import gzip
+import shutil
+from typing import List
+
+COPY_BLOCK = 1 << 22
+
+
+def concat_files(paths: List[str], out_path: str):
+    """Concatenates shard outputs in order and removes them. gzip members concatenate into a valid gzip stream."""
+    with open(out_path, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out, COPY_BLOCK)
+            os.remove(path)
+
+
+def _tag_name(header: bytes, tag: bytes) -> bytes:
+    """'@read/1 comment' -> '@read<tag>/1 comment': the mate suffix stays last."""
+    name, sep, rest = header.rstrip(b"\n").partition(b" ")
+    if name[-2:] in (b"/1", b"/2"):
+        name = name[:-2] + tag + name[-2:]
+    else:
+        name += tag
+    return name + sep + rest + b"\n"
+
+
+def tag_read_names(src: str, dst: str, tag: str, compress: bool = False):
+    """
+    Streams FASTQ `src` to `dst` with `tag` appended to every read name, and removes `src`.
+    Simulators restart their read counters in every run, so shards of one simulation need
+    distinct names before they are concatenated.
+    """
+    tag = tag.encode()
+    opener = gzip.open if compress else open
+    with open(src, "rb") as f, opener(dst, "wb") as out:
+        batch = []
+        for i, line in enumerate(f):
+            if i % 4 == 0:
+                line = _tag_name(line, tag)
+            elif i % 4 == 2:
+                line = b"+\n"
+            batch.append(line)
+            if len(batch) >= 40_000:
+                out.write(b"".join(batch))
+                batch = []
+        out.write(b"".join(batch))
+    os.remove(src)
@@ -1,8 +1,8 @@
-import subprocess
 import os
 from langchain.tools import tool
+from tools import read_sim, runner
+from tools.workspace import workspace_path
 
-WORKSPACE_DIR = "./workspace"
 SEED_REPO_DIR = "./bio_seeds"
 
 @tool
@@ -16,30 +16,53 @@ def get_seed_file_path(filepath: str) -> str:
         raise FileNotFoundError(f"Seed file '{filepath}' not found in '{SEED_REPO_DIR}'.")
     return filepath
 
+# "wgsim" shells out to wgsim; "numpy" uses the in-process simulator in tools.read_sim
+READ_SIM_ENGINE = "wgsim"
+
 @tool
-def simulate_dna_reads_paired(reference_fasta: str, num_reads: int = 1000, mutation_rate: float = 0.001) -> tuple[str, str]:
+def simulate_dna_reads_paired(
+    reference_fasta: str,
+    num_reads: int = 1000,
+    mutation_rate: float = 0.001,
+    engine: str = READ_SIM_ENGINE,
+    seed: int = 42,
+    truth_vcf: bool = False
+) -> tuple[str, ...]:
     """
-    Simulates paired-end DNA reads from a reference FASTA file using wgsim.
-    Returns the paths to the two generated FASTQ files.
+    Simulates paired-end DNA reads from a reference FASTA file using wgsim (or the
+    equivalent in-process NumPy engine). Returns the paths to the two generated FASTQ
+    files, plus the VCF of the introduced mutations when truth_vcf is set (numpy engine).
     """
     print(f"🧬 Simulating {num_reads} paired-end DNA reads...")
-    r1_path = os.path.join(WORKSPACE_DIR, "sim_reads_r1.fastq")
-    r2_path = os.path.join(WORKSPACE_DIR, "sim_reads_r2.fastq")
-    
+    r1_path = workspace_path("sim_reads_r1.fastq")
+    r2_path = workspace_path("sim_reads_r2.fastq")
+
+    if engine == "numpy":
+        vcf_path = workspace_path("sim_reads.truth.vcf") if truth_vcf else None
+        read_sim.simulate_pairs(reference_fasta, r1_path, r2_path, num_reads, mutation_rate,
+                                read_length=100, outer_distance=300, seed=seed, truth_vcf=vcf_path)
+        print(f"✅ DNA reads generated at: {r1_path}, {r2_path}")
+        return (r1_path, r2_path, vcf_path) if truth_vcf else (r1_path, r2_path)
+    if engine != "wgsim":
+        raise ValueError(f"engine must be 'wgsim' or 'numpy', got {engine!r}")
+    if truth_vcf:
+        raise ValueError("truth_vcf needs engine='numpy'")
+
     # wgsim command: wgsim -N <num_reads> -r <mut_rate> <ref.fa> <out1.fq> <out2.fq>
-    cmd = ["conda", "run", "-n", "bio_agent_env",
+    cmd = [
         "wgsim",
         "-N", str(num_reads),
         "-r", str(mutation_rate),
         "-d", "300", # outer distance
         "-1", "100", # read length 1
         "-2", "100", # read length 2
+        "-S", str(seed),
         reference_fasta,
         r1_path,
         r2_path,
     ]
     
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = runner.run("bio_agent_env", cmd, capture_output=True, text=True)
     if result.returncode != 0:
         raise RuntimeError(f"wgsim failed: {result.stderr}")
         
@@ -1,8 +1,11 @@
-import subprocess
 import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from langchain.tools import tool
+from tools import runner
+from tools.fastq import concat_files, tag_read_names
+from tools.workspace import workspace_path, scratch_path
 
-WORKSPACE_DIR = "./workspace"
 SEED_REPO_DIR = "./bio_seeds"
 
 @tool
@@ -16,41 +19,122 @@ def get_seed_file_path(filename: str) -> str:
         raise FileNotFoundError(f"Seed file '{filename}' not found in '{SEED_REPO_DIR}'.")
     return path
 
+ISS_CPUS = 4  # --cpus for an unsharded run; shards get an equal split of the cores
+
+
+def _genome_fastas(genome_list_file: str) -> list:
+    """The genome FASTAs: the file itself if it is a FASTA, else one path per line."""
+    with open(genome_list_file) as f:
+        first = f.readline()
+        if first.startswith(">"):
+            return [genome_list_file]
+        return [line.strip() for line in [first, *f] if line.strip()]
+
+
+def write_abundance_profile(genomes: list, abundance_model: str, seed: int, path: str) -> str:
+    """
+    One relative abundance per genome record (`iss generate --abundance_file` format), drawn
+    like iss' own --abundance distributions. Written once so that every shard samples the
+    same community.
+    """
+    record_ids = []
+    for genome in genomes:
+        with open(genome) as f:
+            record_ids.extend(line[1:].split()[0] for line in f if line.startswith(">"))
+    rng = np.random.default_rng(seed)
+    n = len(record_ids)
+    if abundance_model == "uniform":
+        values = np.ones(n)
+    elif abundance_model == "halfnormal":
+        values = np.abs(rng.normal(size=n))
+    elif abundance_model == "exponential":
+        values = rng.exponential(size=n)
+    elif abundance_model == "lognormal":
+        values = rng.lognormal(size=n)
+    elif abundance_model == "zero_inflated_lognormal":
+        values = rng.lognormal(size=n) * (rng.random(n) >= 0.2)
+        if not values.any():
+            values[rng.integers(n)] = 1.0
+    else:
+        raise ValueError(f"Unknown abundance model '{abundance_model}'")
+    with open(path, "w") as f:
+        for record_id, value in zip(record_ids, values / values.sum()):
+            f.write(f"{record_id}\t{value}\n")
+    return path
+
+
+def _shard_reads(total_reads: int, shards: int) -> list:
+    """Splits total_reads into `shards` even counts (iss draws reads in pairs)."""
+    pairs = total_reads // 2
+    return [2 * (pairs // shards + (i < pairs % shards)) for i in range(shards)]
+
+
 @tool
 def simulate_metagenome_insilicoseq(
     genome_list_file: str, 
     total_reads: int = 1000000, 
-    abundance_model: str = "lognormal"
+    abundance_model: str = "lognormal",
+    shards: int = 1,
+    seed: int = 42,
+    compress: bool = False
 ) -> tuple[str, str]:
+    """
+    Simulates metagenomic paired-end reads with InSilicoSeq (HiSeq error model). With
+    shards > 1 the reads are split over parallel iss runs with seeds derived from `seed`, all
+    sampling one shared abundance profile; read names get a per-shard suffix (_s<i>) before
+    concatenation. Returns the paths to the R1 and R2 FASTQ files (gzipped when compress is set).
+    """
     print(f"🧬 Simulating metagenomic reads with InSilicoSeq...")
-    
-    output_prefix = os.path.join(WORKSPACE_DIR, "iss_metagenome")
-    if not os.path.exists(output_prefix):
-        os.makedirs(output_prefix)
-        
-    r1_path = output_prefix + "_R1.fastq"
-    r2_path = output_prefix + "_R2.fastq"
-    cmd = [
-        "conda", "run", "-n", "issenv", "iss", "generate",
-        "--genomes", genome_list_file,
-        "--n_reads", str(total_reads),
-        "--model", "hiseq",  
-        "--cpus", "4",
-        "--quiet",
-        "--abundance", abundance_model,
-        "-o", output_prefix,
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"InSilicoSeq failed: {result.stderr}")
-        
+
+    genomes = _genome_fastas(genome_list_file)
+    output_prefix = workspace_path("iss_metagenome")
+    suffix = ".fastq.gz" if compress else ".fastq"
+    r1_path = output_prefix + "_R1" + suffix
+    r2_path = output_prefix + "_R2" + suffix
+    abundance_file = write_abundance_profile(genomes, abundance_model, seed, output_prefix + "_abundance.txt")
+
+    counts = [n for n in _shard_reads(total_reads, max(1, shards)) if n > 0] or [total_reads]
+    cpus = ISS_CPUS if len(counts) == 1 else max(1, (os.cpu_count() or 1) // len(counts))
+    # resolved here: the workspace is not visible from the pool threads
+    prefixes = [output_prefix] if len(counts) == 1 else [scratch_path(f"iss_shard{i}") for i in range(len(counts))]
+
+    def run_shard(i: int):
+        prefix = prefixes[i]
+        shard_seed = int(np.random.SeedSequence([seed, i]).generate_state(1)[0])
+        cmd = [
+            "iss", "generate",
+            "--genomes", *genomes,
+            "--n_reads", str(counts[i]),
+            "--model", "hiseq",
+            "--cpus", str(cpus),
+            "--seed", str(shard_seed),
+            "--quiet",
+            "--abundance_file", abundance_file,
+            "-o", prefix,
+        ]
+        if compress and len(counts) == 1:
+            cmd.append("--compress")
+        result = runner.run("issenv", cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"InSilicoSeq failed (shard {i}): {result.stderr}")
+        if len(counts) > 1:
+            # iss read ids restart in every run; tagging (and gzipping) runs per shard in parallel
+            for mate in ("_R1", "_R2"):
+                tag_read_names(prefix + mate + ".fastq", prefix + mate + suffix + ".tagged", f"_s{i}", compress)
+
+    with ThreadPoolExecutor(max_workers=len(counts)) as pool:
+        list(pool.map(run_shard, range(len(counts))))
+    if len(counts) > 1:
+        print(f"  - Concatenating {len(counts)} shards...")
+        concat_files([prefix + "_R1" + suffix + ".tagged" for prefix in prefixes], r1_path)
+        concat_files([prefix + "_R2" + suffix + ".tagged" for prefix in prefixes], r2_path)
+
     print(f"✅ Metagenomic reads generated by InSilicoSeq at: {r1_path}, {r2_path}")
     return r1_path, r2_path
 
 @tool
 def create_genome_list_file(genome_paths: list[str]) -> str:
-    file_path = os.path.join(WORKSPACE_DIR, "genome_list.txt")
+    file_path = workspace_path("genome_list.txt")
     with open(file_path, 'w') as f:
         for genome_name in genome_paths:
             full_path = os.path.join(SEED_REPO_DIR, genome_name)
@@ -1,39 +1,157 @@
 import os
+import re
+import gzip
+import heapq
+import hashlib
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from langchain.tools import tool
-import pyopenms
-from pyopenms import ProteaseDB, ResidueDB, FASTAFile, ProteaseDigestion, AASequence
-from pyopenms import *
-import os
-WORKSPACE_DIR = "./workspace"
+from pyopenms import AASequence, MSExperiment, MSSpectrum, MzMLFile, ProteaseDigestion, TheoreticalSpectrumGenerator
+from tools.ref_index import reference_digest
+from tools.workspace import workspace_path
 SEED_REPO_DIR = "./bio_seeds"
 
-from pyopenms import *
-import os
+PEPTIDE_INDEX_DIR = "./peptide_index"
+DIGEST_WORKERS = os.cpu_count() or 1
+DIGEST_BATCH = 2000  # proteins per process-pool task
+
+
+def iter_fasta(path: str):
+    """Streams (header, sequence) records from a plain or gzipped FASTA file."""
+    opener = gzip.open if path.endswith(".gz") else open
+    header, chunks = None, []
+    with opener(path, "rt") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                if header is not None:
+                    yield header, "".join(chunks)
+                header, chunks = line[1:], []
+            elif line:
+                chunks.append(line)
+    if header is not None:
+        yield header, "".join(chunks)
+
+
+_digesters = {}
+
+
+def digest_sequences(sequences, enzyme: str, min_length: int, max_length: int):
+    """Peptide strings of each protein, in digestion order (runs in pool workers too)."""
+    if enzyme not in _digesters:
+        dig = ProteaseDigestion()
+        dig.setEnzyme(enzyme)
+        _digesters[enzyme] = dig
+    dig = _digesters[enzyme]
+    peptides = []
+    for sequence in sequences:
+        result = []
+        dig.digest(AASequence.fromString(sequence), result, min_length, max_length)
+        peptides.extend(p.toString() for p in result)
+    return peptides
+
+
+def _batches(records, size: int):
+    batch = []
+    for _, sequence in records:
+        batch.append(sequence)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _unique_in_order(peptide_lists):
+    seen = set()
+    for peptides in peptide_lists:
+        for peptide in peptides:
+            if peptide not in seen:
+                seen.add(peptide)
+                yield peptide
+
+
+def _parallel_digest(protein_fasta: str, enzyme: str, min_length: int, max_length: int):
+    """Digests the whole FASTA on a process pool; results come back in FASTA order."""
+    # spawn: this runs inside execute_plan's thread pool, where forking is unsafe
+    with ProcessPoolExecutor(max_workers=DIGEST_WORKERS, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pending = deque()
+        for batch in _batches(iter_fasta(protein_fasta), DIGEST_BATCH):
+            pending.append(pool.submit(digest_sequences, batch, enzyme, min_length, max_length))
+            # keep a bounded number of batches in flight so the FASTA is never fully in memory
+            if len(pending) >= 2 * DIGEST_WORKERS:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def peptide_index(protein_fasta: str, enzyme: str, min_length: int, max_length: int) -> str:
+    """
+    Path to the unique peptides of a full digest, one per line in first-seen order, cached
+    per (FASTA content, enzyme, length bounds) under PEPTIDE_INDEX_DIR.
+    """
+    name = "%s.%s.%d-%d.peptides.gz" % (
+        reference_digest(protein_fasta), re.sub(r"[^A-Za-z0-9]+", "_", enzyme), min_length, max_length
+    )
+    path = os.path.join(PEPTIDE_INDEX_DIR, name)
+    if os.path.exists(path):
+        return path
+    os.makedirs(PEPTIDE_INDEX_DIR, exist_ok=True)
+    print("  - Building peptide index (full digest)...")
+    fd, tmp = tempfile.mkstemp(dir=PEPTIDE_INDEX_DIR, suffix=".tmp")
+    os.close(fd)
+    with gzip.open(tmp, "wt") as f:
+        for peptide in _unique_in_order(_parallel_digest(protein_fasta, enzyme, min_length, max_length)):
+            f.write(peptide + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+def select_peptides(protein_fasta: str, enzyme: str, subset_size: int, subset: str,
+                    min_length: int, max_length: int, seed: int):
+    """
+    "first": the first `subset_size` unique peptides in FASTA order; reading stops as soon
+    as they are found. "sample": `subset_size` peptides ranked by a seeded hash over the
+    full (cached) digest, i.e. a reproducible pseudo-random sample of the whole proteome.
+    """
+    if subset == "first":
+        peptide_lists = (
+            digest_sequences([sequence], enzyme, min_length, max_length)
+            for _, sequence in iter_fasta(protein_fasta)
+        )
+        selected = []
+        for peptide in _unique_in_order(peptide_lists):
+            selected.append(peptide)
+            if len(selected) == subset_size:
+                break
+        return selected
+    if subset == "sample":
+        with gzip.open(peptide_index(protein_fasta, enzyme, min_length, max_length), "rt") as f:
+            peptides = (line.rstrip("\n") for line in f)
+            return heapq.nsmallest(
+                subset_size, peptides,
+                key=lambda p: hashlib.blake2b(f"{seed}:{p}".encode(), digest_size=8).digest(),
+            )
+    raise ValueError(f"subset must be 'first' or 'sample', got {subset!r}")
+
 
 @tool
 def simulate_ms_spectra_pyopenms(
     protein_fasta: str,
-    enzyme: str = "Trypsin"
+    enzyme: str = "Trypsin",
+    subset_size: int = 100,
+    subset: str = "first",
+    min_length: int = 6,
+    max_length: int = 40,
+    seed: int = 42
 ) -> str:
     print(f"🧬 Simulating proteomics MS/MS spectra with pyOpenMS...")
-    mzml_path = os.path.join(WORKSPACE_DIR, "simulated_proteomics.mzML")
-    proteins = []
-    ff = FASTAFile()
-    ff.load(protein_fasta, proteins)
-    dig = ProteaseDigestion()
-    dig.setEnzyme(enzyme)
-    peptides = []
+    mzml_path = workspace_path("simulated_proteomics.mzML")
     print("  - Digesting proteins...")
-    for protein in proteins:
-        result = []
-        protein_seq = AASequence.fromString(protein.sequence)
-        dig.digest(protein_seq, result)
-        peptides.extend(result)
-    
-    unique_peptide_seqs =list(set([p.toString() for p in peptides if 6 <= p.size() <= 40]))
-    print(f"  - Digested into {len(unique_peptide_seqs)} unique peptides.")
-    subset_size = 100
-    target_peptides = unique_peptide_seqs[:subset_size]
+    target_peptides = select_peptides(protein_fasta, enzyme, subset_size, subset, min_length, max_length, seed)
+    print(f"  - Selected {len(target_peptides)} unique peptides ({subset}).")
     print(f"  - Simulating spectra for top {subset_size} peptides...")
     tsg = TheoreticalSpectrumGenerator()
 
@@ -0,0 +1,168 @@
+"""
+In-process paired-end read simulator modelled on wgsim, vectorised with NumPy.
+
+Like wgsim, mutations (SNPs and short indels, `indel_fraction` of them) are first applied to
+the reference, then fragments are sampled from the mutated genome with a normal size
+distribution, read ends get uniform sequencing errors, and mate 2 is reverse-complemented.
+The mutated genome is haploid (wgsim also draws heterozygous sites). Reads are generated
+and written in batches of `batch_size` pairs, so memory does not grow with `num_reads`.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+BATCH_SIZE = 100_000
+QUALITY_CHAR = b"2"  # wgsim writes a constant quality
+
+_BASES = np.frombuffer(b"ACGTN", dtype=np.uint8)
+_ENCODE = np.full(256, 4, dtype=np.uint8)
+for _code, _base in enumerate(b"ACGT"):
+    _ENCODE[_base] = _code
+    _ENCODE[_base + 32] = _code  # lower case
+_COMPLEMENT = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+
+
+def read_fasta(path: str) -> List[Tuple[str, np.ndarray]]:
+    """Contigs as (name, base codes 0-4)."""
+    contigs, name, chunks = [], None, []
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b">"):
+                if name is not None:
+                    contigs.append((name, _ENCODE[np.frombuffer(b"".join(chunks), dtype=np.uint8)]))
+                name, chunks = line[1:].split()[0].decode(), []
+            else:
+                chunks.append(line)
+    if name is not None:
+        contigs.append((name, _ENCODE[np.frombuffer(b"".join(chunks), dtype=np.uint8)]))
+    return contigs
+
+
+def mutate(rng: np.random.Generator, ref: np.ndarray, mutation_rate: float,
+           indel_fraction: float = 0.15, indel_extend: float = 0.3):
+    """
+    Returns (haplotype, variants) where variants are (0-based pos, REF, ALT) in VCF style:
+    indels are anchored on the base before them.
+    """
+    n_sites = rng.binomial(len(ref), mutation_rate)
+    # site 0 has no anchor base for an indel, keep it out
+    # sampling from an int population avoids materialising a genome-sized arange
+    positions = np.sort(rng.choice(len(ref) - 1, size=min(n_sites, len(ref) - 1), replace=False) + 1)
+    kinds = rng.random(len(positions))  # < indel_fraction / 2: deletion, < indel_fraction: insertion
+    lengths = rng.geometric(1 - indel_extend, len(positions))
+
+    seq = ref.copy()
+    keep = np.ones(len(ref), dtype=bool)
+    ins_at, ins_bases, variants = [], [], []
+    blocked_until = -1
+    for pos, kind, length in zip(positions.tolist(), kinds.tolist(), lengths.tolist()):
+        if pos - 1 <= blocked_until or ref[pos] == 4:
+            continue  # overlaps the previous variant or its anchor base, or an N
+        if kind < indel_fraction / 2 and pos + length <= len(ref):
+            keep[pos:pos + length] = False
+            anchor = pos - 1
+            variants.append((anchor, _BASES[ref[anchor:pos + length]].tobytes(), _BASES[ref[anchor:anchor + 1]].tobytes()))
+            blocked_until = pos + length - 1
+        elif kind < indel_fraction:
+            bases = rng.integers(0, 4, length, dtype=np.uint8)
+            ins_at.append(np.full(length, pos))
+            ins_bases.append(bases)
+            anchor = pos - 1
+            variants.append((anchor, _BASES[ref[anchor:pos]].tobytes(), _BASES[np.concatenate([ref[anchor:pos], bases])].tobytes()))
+            blocked_until = pos
+        else:
+            alt = (ref[pos] + rng.integers(1, 4)) % 4
+            seq[pos] = alt
+            variants.append((pos, _BASES[ref[pos:pos + 1]].tobytes(), _BASES[[alt]].tobytes()))
+            blocked_until = pos
+    if ins_at:
+        # inserting into the keep mask alongside the sequence keeps both aligned
+        at = np.concatenate(ins_at)
+        seq = np.insert(seq, at, np.concatenate(ins_bases))
+        keep = np.insert(keep, at, True)
+    return seq[keep], sorted(variants)
+
+
+def write_truth_vcf(path: str, contigs, variants_by_contig):
+    with open(path, "wb") as f:
+        f.write(b"##fileformat=VCFv4.2\n##source=biogen_read_sim\n")
+        for name, ref in contigs:
+            f.write(f"##contig=<ID={name},length={len(ref)}>\n".encode())
+        f.write(b"#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        for (name, _), variants in zip(contigs, variants_by_contig):
+            for pos, ref_allele, alt_allele in variants:
+                f.write(b"%s\t%d\t.\t%s\t%s\t.\tPASS\t.\n" % (name.encode(), pos + 1, ref_allele, alt_allele))
+
+
+def _fastq_chunk(names: List[bytes], reads: np.ndarray) -> bytes:
+    """FASTQ records for equal-length reads, assembled from one (n, L) byte matrix."""
+    seqs = _BASES[reads]
+    quality = QUALITY_CHAR * reads.shape[1]
+    return b"".join(
+        b"@%s\n%s\n+\n%s\n" % (name, seq, quality) for name, seq in zip(names, map(bytes, seqs))
+    )
+
+
+def simulate_pairs(
+    reference_fasta: str,
+    r1_path: str,
+    r2_path: str,
+    num_reads: int = 1000,
+    mutation_rate: float = 0.001,
+    read_length: int = 100,
+    outer_distance: int = 300,
+    std_dev: int = 50,
+    error_rate: float = 0.02,
+    indel_fraction: float = 0.15,
+    seed: int = 42,
+    truth_vcf: Optional[str] = None,
+    batch_size: int = BATCH_SIZE,
+) -> None:
+    """Writes `num_reads` read pairs to r1_path / r2_path (wgsim -N -1 -2 -d -s -e -r -R)."""
+    contigs = read_fasta(reference_fasta)
+    if not contigs:
+        raise ValueError(f"No sequences in {reference_fasta}")
+    mutate_rng = np.random.default_rng([seed, 0])
+    mutated = [mutate(mutate_rng, ref, mutation_rate, indel_fraction) for _, ref in contigs]
+    if truth_vcf:
+        write_truth_vcf(truth_vcf, contigs, [variants for _, variants in mutated])
+
+    haplotypes = [hap for hap, _ in mutated]
+    usable = np.array([len(h) if len(h) >= read_length else 0 for h in haplotypes], dtype=np.float64)
+    if usable.sum() == 0:
+        raise ValueError(f"All sequences in {reference_fasta} are shorter than the read length {read_length}")
+    names = [name.encode() for name, _ in contigs]
+    offsets = np.arange(read_length)
+
+    with open(r1_path, "wb", buffering=1 << 22) as f1, open(r2_path, "wb", buffering=1 << 22) as f2:
+        for batch_index, start in enumerate(range(0, num_reads, batch_size)):
+            rng = np.random.default_rng([seed, batch_index + 1])
+            n = min(batch_size, num_reads - start)
+            which = rng.choice(len(haplotypes), size=n, p=usable / usable.sum())
+            r1 = np.empty((n, read_length), dtype=np.uint8)
+            r2 = np.empty((n, read_length), dtype=np.uint8)
+            frag_start = np.empty(n, dtype=np.int64)
+            frag_len = np.empty(n, dtype=np.int64)
+            for c in np.unique(which):
+                rows = np.flatnonzero(which == c)
+                hap = haplotypes[c]
+                size = np.rint(rng.normal(outer_distance, std_dev, len(rows))).astype(np.int64)
+                size = np.clip(size, read_length, len(hap))
+                begin = (rng.random(len(rows)) * (len(hap) - size + 1)).astype(np.int64)
+                left = hap[begin[:, None] + offsets]
+                right = _COMPLEMENT[hap[(begin + size - read_length)[:, None] + offsets]][:, ::-1]
+                # half of the fragments come from the reverse strand: swap the mates
+                flip = rng.random(len(rows)) < 0.5
+                r1[rows] = np.where(flip[:, None], right, left)
+                r2[rows] = np.where(flip[:, None], left, right)
+                frag_start[rows], frag_len[rows] = begin, size
+            for reads in (r1, r2):
+                errors = (rng.random(reads.shape) < error_rate) & (reads < 4)
+                reads[errors] = (reads[errors] + rng.integers(1, 4, errors.sum(), dtype=np.uint8)) % 4
+            read_names = [
+                b"%s_%d_%d_%d" % (names[c], s + 1, s + l, start + i)
+                for i, (c, s, l) in enumerate(zip(which.tolist(), frag_start.tolist(), frag_len.tolist()))
+            ]
+            f1.write(_fastq_chunk([name + b"/1" for name in read_names], r1))
+            f2.write(_fastq_chunk([name + b"/2" for name in read_names], r2))
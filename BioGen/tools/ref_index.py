@@ -0,0 +1,97 @@
+import os
+import fcntl
+import shutil
+import threading
+from typing import Dict, Tuple
+
+from tools import runner
+from tools.artifact_cache import sha256_file
+
+REF_INDEX_DIR = "./ref_index"
+
+# index type -> (builder command, path handed to the tools); {fasta} is the reference copy
+# inside the index directory, {prefix} the index prefix next to it and {annotation} the GTF
+INDEX_TYPES = {
+    "bwa": (["bwa", "index", "{fasta}"], "{fasta}"),
+    "faidx": (["samtools", "faidx", "{fasta}"], "{fasta}"),
+    "rsem_bowtie2": (["rsem-prepare-reference", "--quiet", "--bowtie2", "{fasta}", "{prefix}"], "{prefix}"),
+    "rsem_bowtie2_gtf": (["rsem-prepare-reference", "--quiet", "--bowtie2", "--gtf", "{annotation}", "{fasta}", "{prefix}"], "{prefix}"),
+    "bowtie2": (["bowtie2-build", "--quiet", "{fasta}", "{prefix}"], "{prefix}"),
+}
+
+_digests: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+def reference_digest(reference_fasta: str) -> str:
+    st = os.stat(reference_fasta)
+    key = (os.path.abspath(reference_fasta), st.st_size, st.st_mtime_ns)
+    with _digest_lock:
+        if key in _digests:
+            return _digests[key]
+    digest = sha256_file(reference_fasta)
+    with _digest_lock:
+        _digests[key] = digest
+    return digest
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def build_once(base: str, name: str, build) -> str:
+    """
+    <base>/<name>, created by `build(tmp_dir)` on first use. Builds are serialised with a
+    file lock and published with an atomic rename, so concurrent workers (threads or
+    processes) never see a half-built directory.
+    """
+    target = os.path.join(base, name)
+    if os.path.isdir(target):
+        return target
+    os.makedirs(base, exist_ok=True)
+    with open(os.path.join(base, f"{name}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if not os.path.isdir(target):
+            build_dir = os.path.join(base, f"{name}.tmp-{os.getpid()}-{threading.get_ident()}")
+            shutil.rmtree(build_dir, ignore_errors=True)
+            os.makedirs(build_dir)
+            try:
+                build(build_dir)
+            except Exception:
+                shutil.rmtree(build_dir, ignore_errors=True)
+                raise
+            os.rename(build_dir, target)
+    return target
+
+
+def reference_index(reference_fasta: str, kind: str, env_name: str = "bio_agent_env", root: str = REF_INDEX_DIR,
+                    annotation: str = None) -> str:
+    """
+    Returns the path to pass to the aligner/caller/simulator for a `kind` index of
+    `reference_fasta` (and `annotation`, for kinds that take a GTF), building it on first use.
+
+    Indexes live in <root>/<sha256 of the FASTA>/<kind>[.<sha256 of the GTF>]/, so the same
+    content is indexed once for every task and workspace, and a different FASTA under the
+    same name never reuses a stale index.
+    """
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}'; expected one of {sorted(INDEX_TYPES)}")
+    build_cmd, result = INDEX_TYPES[kind]
+    if ("{annotation}" in build_cmd) != (annotation is not None):
+        raise ValueError(f"Index type '{kind}' {'needs' if annotation is None else 'takes no'} annotation")
+    name = os.path.basename(reference_fasta)
+    base = os.path.join(root, reference_digest(reference_fasta))
+    dir_name = kind if annotation is None else f"{kind}.{reference_digest(annotation)[:16]}"
+
+    def build(build_dir):
+        print(f"⏳ Building {kind} index for {reference_fasta}...")
+        paths = {"fasta": os.path.join(build_dir, name), "prefix": os.path.join(build_dir, "ref"),
+                 "annotation": os.path.abspath(annotation) if annotation else ""}
+        _link_or_copy(reference_fasta, paths["fasta"])
+        runner.run_pipeline(env_name, [[arg.format(**paths) for arg in build_cmd]])
+
+    index_dir = build_once(base, dir_name, build)
+    return result.format(fasta=os.path.join(index_dir, name), prefix=os.path.join(index_dir, "ref"))
@@ -0,0 +1,51 @@
+import json
+import os
+from typing import Any, Dict, Set
+
+
+def read_done_ids(path: str) -> Set[str]:
+    """Ids already in a JSONL results file. A torn last line (crash mid-write) is ignored."""
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, "r") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            if line.strip():
+                done.add(json.loads(line)["id"])
+    return done
+
+
+class ResultsWriter:
+    """Appends one JSON record per line, flushed as it is written, after dropping a torn last line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.f = open(path, "ab+")
+        self.f.seek(0, os.SEEK_END)
+        if self.f.tell():
+            self.f.seek(-1, os.SEEK_END)
+            if self.f.read(1) != b"\n":
+                self.f.seek(0)
+                data = self.f.read()
+                self.f.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, record: Dict[str, Any]):
+        self.f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.f.flush()
+
+    def close(self):
+        if not self.f.closed:
+            self.f.flush()
+            os.fsync(self.f.fileno())
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
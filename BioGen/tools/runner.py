@@ -0,0 +1,115 @@
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+from typing import Dict, List
+
+# Set BIOGEN_NO_CONDA=1 when the tools are installed on PATH (e.g. inside a container)
+NO_CONDA = os.environ.get("BIOGEN_NO_CONDA") == "1"
+
+_env_cache: Dict[str, Dict[str, str]] = {}
+_bin_cache: Dict[tuple, str] = {}
+_lock = threading.Lock()
+
+
+def _conda_exe() -> str:
+    conda = os.environ.get("CONDA_EXE") or shutil.which("conda")
+    if not conda:
+        raise RuntimeError("conda not found; set CONDA_EXE, or BIOGEN_NO_CONDA=1 to use binaries from PATH")
+    return conda
+
+
+def conda_environ(env_name: str) -> Dict[str, str]:
+    """
+    The process environment `conda run -n <env_name>` would give a command (PATH, CONDA_PREFIX,
+    variables from activate.d scripts), captured once per process with `env -0`.
+    """
+    with _lock:
+        if env_name in _env_cache:
+            return _env_cache[env_name]
+    if NO_CONDA:
+        environ = dict(os.environ)
+    else:
+        result = subprocess.run(
+            [_conda_exe(), "run", "-n", env_name, "env", "-0"],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Could not activate conda env '{env_name}': {result.stderr}")
+        environ = dict(item.split("=", 1) for item in result.stdout.split("\0") if "=" in item)
+    with _lock:
+        _env_cache[env_name] = environ
+    return environ
+
+
+def resolve(env_name: str, program: str) -> str:
+    """Absolute path of `program` inside the conda env, cached per (env, program)."""
+    key = (env_name, program)
+    with _lock:
+        if key in _bin_cache:
+            return _bin_cache[key]
+    path = shutil.which(program, path=conda_environ(env_name).get("PATH"))
+    if path is None:
+        raise FileNotFoundError(f"'{program}' not found in conda env '{env_name}'")
+    with _lock:
+        _bin_cache[key] = path
+    return path
+
+
+def command(env_name: str, cmd: List[str]) -> List[str]:
+    return [resolve(env_name, cmd[0]), *cmd[1:]]
+
+
+def run(env_name: str, cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run(cmd) inside `env_name`, without paying for `conda run` on every call."""
+    return subprocess.run(command(env_name, cmd), env=conda_environ(env_name), **kwargs)
+
+
+def popen(env_name: str, cmd: List[str], **kwargs) -> subprocess.Popen:
+    return subprocess.Popen(command(env_name, cmd), env=conda_environ(env_name), **kwargs)
+
+
+def run_pipeline(env_name: str, cmds: List[List[str]], stdin=None, stdout=None) -> List[str]:
+    """
+    Runs `cmds[0] | cmds[1] | ...` inside `env_name` without intermediate files. Every
+    stage's stderr is captured (to temp files, so a chatty stage cannot block the pipe).
+    Returns the stderr texts; raises RuntimeError listing each stage that failed.
+    """
+    procs, errs = [], []
+    upstream = stdin
+    try:
+        for i, cmd in enumerate(cmds):
+            err = tempfile.TemporaryFile()
+            errs.append(err)
+            last = i == len(cmds) - 1
+            procs.append(popen(env_name, cmd, stdin=upstream, stdout=stdout if last else subprocess.PIPE, stderr=err))
+            if i > 0:
+                # only the next stage holds the read end, so it sees EOF / the writer sees SIGPIPE
+                upstream.close()
+            upstream = procs[-1].stdout
+    except Exception:
+        for proc in procs:
+            proc.kill()
+        raise
+    finally:
+        for proc in procs:
+            proc.wait()
+
+    stderrs = []
+    for err in errs:
+        err.seek(0)
+        stderrs.append(err.read().decode(errors="replace"))
+        err.close()
+    # an upstream stage killed by SIGPIPE only means a later stage stopped reading early;
+    # if that later stage failed it is reported itself
+    failed = [
+        (cmd[0], proc.returncode, text)
+        for i, (cmd, proc, text) in enumerate(zip(cmds, procs, stderrs))
+        if proc.returncode != 0 and not (i < len(cmds) - 1 and proc.returncode == -signal.SIGPIPE)
+    ]
+    if failed:
+        details = "\n".join(f"[{name} exited {code}] {text.strip()}" for name, code, text in failed)
+        raise RuntimeError(f"Pipeline failed:\n{details}")
+    return stderrs
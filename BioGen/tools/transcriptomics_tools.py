@@ -1,76 +1,285 @@
-import subprocess
 import os
+import heapq
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
 from langchain.tools import tool
+from tools import read_sim, runner
+from tools.fastq import COPY_BLOCK, concat_files, tag_read_names
+from tools.ref_index import build_once, reference_index
+from tools.workspace import workspace_path, scratch_path
 
-WORKSPACE_DIR = "./workspace"
 SEED_REPO_DIR = "./bio_seeds"
 
+# ART chunks run in parallel; opt in per call, since the tools already run inside
+# execute_plan's and batch_generate's pools
+ART_WORKERS = 1
+
+
+def _concat_aln(paths: list, out_path: str):
+    """ART .aln files: the first chunk's header with every chunk's @SQ lines, then all alignments."""
+    headers, bodies = [], []
+    for path in paths:
+        with open(path) as f:
+            header = []
+            for line in iter(f.readline, ""):
+                header.append(line)
+                if line.startswith("##Header End"):
+                    break
+            headers.append(header)
+            bodies.append(f.tell())
+    sq_lines = [line for header in headers for line in header if line.startswith("@SQ")]
+    with open(out_path, "w") as out:
+        for line in headers[0]:
+            if line.startswith("@SQ"):
+                out.writelines(sq_lines)
+                sq_lines = []
+            else:
+                out.write(line)
+        for path, body_start in zip(paths, bodies):
+            with open(path) as f:
+                f.seek(body_start)
+                shutil.copyfileobj(f, out, COPY_BLOCK)
+            os.remove(path)
+
+
+def split_fasta_balanced(fasta_path: str, n_chunks: int, prefix: str) -> list:
+    """
+    Splits a FASTA into at most `n_chunks` files of near-equal total sequence length
+    (largest records first, each to the lightest chunk). Records keep their file order within
+    a chunk; sequences are copied by byte range in blocks of at most COPY_BLOCK bytes.
+    """
+    records = []  # (start offset, end offset, sequence length)
+    with open(fasta_path, "rb") as f:
+        start, length, offset = None, 0, 0
+        for line in f:
+            if line.startswith(b">"):
+                if start is not None:
+                    records.append((start, offset, length))
+                start, length = offset, 0
+            else:
+                length += len(line.strip())
+            offset += len(line)
+        if start is not None:
+            records.append((start, offset, length))
+    n_chunks = max(1, min(n_chunks, len(records)))
+
+    heap = [(0, i) for i in range(n_chunks)]
+    chunk_of = [0] * len(records)
+    for r in sorted(range(len(records)), key=lambda r: -records[r][2]):
+        total, chunk = heapq.heappop(heap)
+        chunk_of[r] = chunk
+        heapq.heappush(heap, (total + records[r][2], chunk))
+
+    paths = [f"{prefix}{i}.fa" for i in range(n_chunks)]
+    outs = [open(path, "wb") for path in paths]
+    try:
+        with open(fasta_path, "rb") as f:
+            for (start, end, _), chunk in zip(records, chunk_of):
+                f.seek(start)
+                remaining = end - start
+                while remaining:
+                    block = f.read(min(remaining, COPY_BLOCK))
+                    outs[chunk].write(block)
+                    remaining -= len(block)
+    finally:
+        for out in outs:
+            out.close()
+    return paths
+
+
 @tool
 def simulate_rna_seq_reads_art(
     reference_transcriptome_fasta: str, 
     num_reads_per_transcript: int = 50,
-    read_length: int = 100
+    read_length: int = 100,
+    workers: int = ART_WORKERS,
+    seed: int = 42,
+    write_aln: bool = False
 ) -> tuple[str, str]:
+    """
+    Simulates paired-end RNA-Seq reads with ART (HiSeq 2500 profile) at a fold coverage of
+    num_reads_per_transcript per transcript. The transcriptome is split into length-balanced
+    chunks simulated in parallel and merged. ART's .aln files are only kept with write_aln.
+    Returns the paths to the two FASTQ files.
+    """
     print(f"🧬 Simulating RNA-Seq reads with ART...")
-    output_prefix = os.path.join(WORKSPACE_DIR, "art_sim_rna")
-    if not os.path.exists(output_prefix):
-        os.makedirs(output_prefix)
+    output_prefix = workspace_path("art_sim_rna")
     r1_path = output_prefix + "1.fq"
     r2_path = output_prefix + "2.fq"
-    cmd = [
-        "conda", "run", "-n", "bio_agent_env", "art_illumina",
-        "-ss", "HS25",  
-        "-i", reference_transcriptome_fasta,
-        "-p",  
-        "-l", str(read_length),
-        "-f", str(num_reads_per_transcript),
-        "-m", "300", 
-        "-s", "50",  
-        "-o", output_prefix,
-    ]
-    print(f"ART command: {' '.join(cmd)}")
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"ART Illumina failed: {result.stderr}\n{result.stdout}")
+    if workers > 1:
+        chunks = split_fasta_balanced(reference_transcriptome_fasta, workers, scratch_path("art_chunk"))
+    else:
+        chunks = [reference_transcriptome_fasta]
+    # resolved here: the workspace is not visible from the pool threads
+    prefixes = [output_prefix] if len(chunks) == 1 else [scratch_path(f"art_sim_rna.chunk{i}.") for i in range(len(chunks))]
+
+    def run_chunk(i: int):
+        cmd = [
+            "art_illumina",
+            "-ss", "HS25",  
+            "-i", chunks[i],
+            "-p",  
+            "-l", str(read_length),
+            "-f", str(num_reads_per_transcript),
+            "-m", "300", 
+            "-s", "50",  
+            "-rs", str(int(np.random.SeedSequence([seed, i]).generate_state(1)[0] % 2**31)),
+            "-o", prefixes[i],
+        ]
+        if not write_aln:
+            cmd.append("-na")
+        if len(chunks) == 1:
+            print(f"ART command: {' '.join(cmd)}")
+
+        result = runner.run("bio_agent_env", cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ART Illumina failed: {result.stderr}\n{result.stdout}")
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        list(pool.map(run_chunk, range(len(chunks))))
+    if len(chunks) > 1:
+        print(f"  - Merging {len(chunks)} ART chunks...")
+        concat_files([prefix + "1.fq" for prefix in prefixes], r1_path)
+        concat_files([prefix + "2.fq" for prefix in prefixes], r2_path)
+        if write_aln:
+            _concat_aln([prefix + "1.aln" for prefix in prefixes], output_prefix + "1.aln")
+            _concat_aln([prefix + "2.aln" for prefix in prefixes], output_prefix + "2.aln")
+        for chunk in chunks:
+            os.remove(chunk)
         
     print(f"✅ RNA-Seq reads generated by ART at: {r1_path}, {r2_path}")
     return r1_path, r2_path
 
+MIN_SHARD_READS = 100_000  # below this one rsem-simulate-reads run is faster than sharding
+RSEM_THETA0 = 0.1  # fraction of reads from the noise transcript
+RSEM_MODEL_PAIRS = 20_000  # read pairs used to learn the simulation model
+EXPRESSION_SIGMA = 2.0  # sigma of the lognormal TPM model
+ISOFORMS_COLUMNS = ["transcript_id", "gene_id", "length", "effective_length", "expected_count", "TPM", "FPKM", "IsoPct"]
+
+
+def rsem_model(ref_path: str) -> tuple[str, str]:
+    """
+    (model file, isoforms.results template) for an RSEM reference, learned once per reference
+    by running rsem-calculate-expression on error-prone reads simulated from its transcripts.
+    rsem-simulate-reads needs such a model; the template fixes transcript order and lengths.
+    """
+    index_dir = os.path.dirname(ref_path)
+
+    def build(build_dir):
+        print(f"⏳ Learning RSEM simulation model for {ref_path}...")
+        r1 = os.path.join(build_dir, "train_1.fq")
+        r2 = os.path.join(build_dir, "train_2.fq")
+        read_sim.simulate_pairs(ref_path + ".transcripts.fa", r1, r2, RSEM_MODEL_PAIRS, 0.0, seed=0)
+        runner.run_pipeline("bio_agent_env", [[
+            "rsem-calculate-expression", "--paired-end", "--bowtie2", "--no-bam-output", "-q",
+            "-p", str(os.cpu_count() or 1), "--seed", "0",
+            r1, r2, ref_path, os.path.join(build_dir, "train"),
+        ]])
+        os.remove(r1)
+        os.remove(r2)
+
+    model_dir = build_once(os.path.dirname(index_dir), os.path.basename(index_dir) + ".model", build)
+    return (os.path.join(model_dir, "train.stat", "train.model"),
+            os.path.join(model_dir, "train.isoforms.results"))
+
+
+def isoforms_results(template_path: str, total_reads: int, tpm_file: str = None, seed: int = 42) -> pd.DataFrame:
+    """
+    An isoforms.results table over the reference transcripts: TPMs from `tpm_file`
+    (transcript_id and TPM columns; unlisted transcripts get 0) or lognormal, and the
+    matching expected_count, FPKM and IsoPct.
+    """
+    table = pd.read_csv(template_path, sep="\t", usecols=ISOFORMS_COLUMNS[:4])
+    eff_length = table["effective_length"].to_numpy(dtype=float)
+    if tpm_file:
+        supplied = pd.read_csv(tpm_file, sep="\t", usecols=["transcript_id", "TPM"])
+        tpm = table["transcript_id"].map(supplied.set_index("transcript_id")["TPM"]).fillna(0).to_numpy(dtype=float)
+    else:
+        tpm = np.random.default_rng(seed).lognormal(0.0, EXPRESSION_SIGMA, len(table))
+    # a transcript shorter than the fragments cannot be sampled
+    tpm = np.where(eff_length > 0, tpm, 0.0)
+    if tpm.sum() == 0:
+        raise ValueError("No expressed transcript has a positive effective length")
+    tpm = tpm / tpm.sum() * 1e6
+
+    counts = tpm * eff_length
+    counts = counts / counts.sum() * (total_reads * (1 - RSEM_THETA0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fpkm = np.where(eff_length > 0, counts / (eff_length / 1e3) / (total_reads / 1e6), 0.0)
+    gene_tpm = pd.Series(tpm).groupby(table["gene_id"].to_numpy()).transform("sum").to_numpy()
+    table["expected_count"] = counts
+    table["TPM"] = tpm
+    table["FPKM"] = fpkm
+    table["IsoPct"] = np.where(gene_tpm > 0, 100 * tpm / np.where(gene_tpm > 0, gene_tpm, 1), 0.0)
+    return table[ISOFORMS_COLUMNS]
+
+
+def _shard_counts(total_reads: int, shards: int) -> list:
+    shards = max(1, min(shards, -(-total_reads // MIN_SHARD_READS)))
+    return [total_reads // shards + (i < total_reads % shards) for i in range(shards)]
+
+
 @tool
 def simulate_rna_seq_reads_rsem(
     reference_transcriptome_fasta: str,
-    total_reads: int = 1000000
+    total_reads: int = 1000000,
+    gtf_file: str = None,
+    tpm_file: str = None,
+    seed: int = 42,
+    shards: int = 1
 ) -> tuple[str, str]:
+    """
+    Simulates paired-end RNA-Seq reads with RSEM from a generated expression profile
+    (lognormal TPMs, or the transcript_id/TPM table in tpm_file). With gtf_file, the FASTA is
+    a genome and the transcripts come from the GTF. With shards > 1, large runs are split over
+    parallel rsem-simulate-reads runs whose read names get a per-shard suffix (_s<i>).
+    Returns the paths to the two FASTQ files.
+    """
     print("🧬 Simulating RNA-Seq reads with RSEM...")
-    ref_name = "rsem_ref"
-    ref_path = os.path.join(WORKSPACE_DIR, ref_name)
-    if not os.path.exists(ref_path + ".grp"):
-        print(f"⏳ Preparing RSEM reference for {reference_transcriptome_fasta}...")
-        cmd_prep = ["conda", "run", "-n", "bio_agent_env","rsem-prepare-reference", "--quiet", reference_transcriptome_fasta, ref_path]
-        subprocess.run(cmd_prep, check=True)
-    output_prefix = os.path.join(WORKSPACE_DIR, "rsem_sim")
-    if not os.path.exists(output_prefix):
-        os.makedirs(output_prefix)
+    if gtf_file:
+        ref_path = reference_index(reference_transcriptome_fasta, "rsem_bowtie2_gtf", annotation=gtf_file)
+    else:
+        ref_path = reference_index(reference_transcriptome_fasta, "rsem_bowtie2")
+    model_path, template_path = rsem_model(ref_path)
+    output_prefix = workspace_path("rsem_sim")
     r1_path = output_prefix + "_1.fq"
     r2_path = output_prefix + "_2.fq"
-    isoform_results_path = os.path.join(WORKSPACE_DIR, "dummy.isoforms.results")
-    with open(isoform_results_path, 'w') as f:
-        f.write("transcript_id\tgene_id\tlength\teffective_length\tFPKM\tTPM\tIsoPct\n")
-    
-    cmd_sim = [
-        "conda", "run", "-n", "bio_agent_env",
-        "rsem-simulate-reads",
-        ref_path,
-        isoform_results_path, 
-        "0.1", 
-        str(total_reads),
-        output_prefix
-    ]
-    
-    result = subprocess.run(cmd_sim, capture_output=True, text=True)
-    if "Can not open" in result.stderr or result.returncode != 0:
-        raise RuntimeError(f"RSEM simulation failed: {result.stderr}")
+    isoform_results_path = workspace_path("rsem_sim.isoforms.results")
+    isoforms_results(template_path, total_reads, tpm_file, seed).to_csv(
+        isoform_results_path, sep="\t", index=False, float_format="%.6g"
+    )
+
+    counts = _shard_counts(total_reads, shards)
+    # resolved here: the workspace is not visible from the pool threads
+    prefixes = [output_prefix] if len(counts) == 1 else [scratch_path(f"rsem_shard{i}") for i in range(len(counts))]
+
+    def run_shard(i: int):
+        cmd_sim = [
+            "rsem-simulate-reads",
+            ref_path,
+            model_path,
+            isoform_results_path,
+            str(RSEM_THETA0),
+            str(counts[i]),
+            prefixes[i],
+            "--seed", str(int(np.random.SeedSequence([seed, i]).generate_state(1)[0])),
+        ]
+        result = runner.run("bio_agent_env", cmd_sim, capture_output=True, text=True)
+        if "Can not open" in result.stderr or result.returncode != 0:
+            raise RuntimeError(f"RSEM simulation failed: {result.stderr}")
+        if len(counts) > 1:
+            # RSEM numbers reads from 0 in every run
+            for mate in ("_1.fq", "_2.fq"):
+                tag_read_names(prefixes[i] + mate, prefixes[i] + mate + ".tagged", f"_s{i}")
+
+    with ThreadPoolExecutor(max_workers=len(counts)) as pool:
+        list(pool.map(run_shard, range(len(counts))))
+    if len(counts) > 1:
+        print(f"  - Concatenating {len(counts)} shards...")
+        concat_files([prefix + "_1.fq.tagged" for prefix in prefixes], r1_path)
+        concat_files([prefix + "_2.fq.tagged" for prefix in prefixes], r2_path)
 
     print(f"✅ RNA-Seq reads generated by RSEM at: {r1_path}, {r2_path}")
     return r1_path, r2_path
@@ -1,96 +1,259 @@
-import subprocess
+import io
 import os
+import functools
+import subprocess
+import multiprocessing
 import msprime
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from langchain.tools import tool
+from tools import runner
+from tools.genomics_tools import simulate_dna_reads_paired  # shared implementation
+from tools.ref_index import reference_index
+from tools.workspace import workspace_path, scratch_path
 
-WORKSPACE_DIR = "./workspace"
 SEED_REPO_DIR = "./bio_seeds"
 
-@tool
-def simulate_dna_reads_paired(reference_fasta: str, num_reads: int = 1000, mutation_rate: float = 0.001) -> tuple[str, str]:
-    print(f"Simulating {num_reads} paired-end DNA reads...")
-    r1_path = os.path.join(WORKSPACE_DIR, "sim_reads_r1.fastq")
-    r2_path = os.path.join(WORKSPACE_DIR, "sim_reads_r2.fastq")
-    cmd = [
-        "conda", "run", "-n", "bio_agent_env", "wgsim",
-        "-N", str(num_reads),
-        "-r", str(mutation_rate),
-        "-d", "300", # outer distance
-        "-1", "100", # read length 1
-        "-2", "100", # read length 2
-        reference_fasta,
-        r1_path,
-        r2_path,
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise RuntimeError(f"wgsim failed: {result.stderr}")
-        
-    print(f"DNA reads generated at: {r1_path}, {r2_path}")
-    return r1_path, r2_path
+BWA_THREADS = 4
+SORT_THREADS = 2
+SORT_MEMORY = "768M"  # per samtools sort thread
+
 
 @tool
-def align_reads_bwa(reference_fasta: str, reads_r1_fastq: str, reads_r2_fastq: str) -> str:
+def align_reads_bwa(
+    reference_fasta: str,
+    reads_r1_fastq: str,
+    reads_r2_fastq: str,
+    threads: int = BWA_THREADS,
+    sort_threads: int = SORT_THREADS,
+    sort_memory: str = SORT_MEMORY,
+    streaming: bool = True,
+) -> str:
     print(f"Aligning reads from {reads_r1_fastq} and {reads_r2_fastq} to {reference_fasta}...")
-    if not os.path.exists(reference_fasta + ".bwt"):
-        print(f"Indexing reference fasta: {reference_fasta}...")
-        subprocess.run(["conda", "run", "-n", "bio_agent_env", "bwa", "index", reference_fasta], check=True)
-
-    sam_path = os.path.join(WORKSPACE_DIR, "aligned_reads.sam")
-    bam_path = os.path.join(WORKSPACE_DIR, "aligned_reads.bam")
-    sorted_bam_path = os.path.join(WORKSPACE_DIR, "aligned_reads.sorted.bam")
-    with open(sam_path, "w") as f_sam:
-        cmd_bwa = ["conda", "run", "-n", "bio_agent_env", "bwa", "mem", "-t", "4", reference_fasta, reads_r1_fastq, reads_r2_fastq]
-        result = subprocess.run(cmd_bwa, stdout=f_sam, stderr=subprocess.PIPE, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"BWA-MEM failed: {result.stderr}")
-    
-    subprocess.run(["conda", "run", "-n", "bio_agent_env", "samtools", "view", "-bS", sam_path, "-o", bam_path], check=True)
-    subprocess.run(["conda", "run", "-n", "bio_agent_env", "samtools", "sort", bam_path, "-o", sorted_bam_path], check=True)
-    subprocess.run(["conda", "run", "-n", "bio_agent_env", "samtools", "index", sorted_bam_path], check=True)
-    
-    os.remove(sam_path)
-    os.remove(bam_path) 
+    bwa_index = reference_index(reference_fasta, "bwa")
+
+    sorted_bam_path = workspace_path("aligned_reads.sorted.bam")
+    cmd_bwa = ["bwa", "mem", "-t", str(threads), bwa_index, reads_r1_fastq, reads_r2_fastq]
+    cmd_sort = ["samtools", "sort", "-@", str(sort_threads), "-m", sort_memory,
+                "-T", scratch_path("aligned_reads.sort"), "-o", sorted_bam_path]
+    if streaming:
+        # bwa mem | samtools sort: no SAM or unsorted BAM ever touches the disk
+        runner.run_pipeline("bio_agent_env", [cmd_bwa, cmd_sort + ["-"]])
+    else:
+        sam_path = scratch_path("aligned_reads.sam")
+        with open(sam_path, "w") as f_sam:
+            runner.run_pipeline("bio_agent_env", [cmd_bwa], stdout=f_sam)
+        runner.run_pipeline("bio_agent_env", [cmd_sort + [sam_path]])
+        os.remove(sam_path)
+    runner.run_pipeline("bio_agent_env", [["samtools", "index", "-@", str(sort_threads), sorted_bam_path]])
 
     print(f"Reads aligned. Sorted BAM at: {sorted_bam_path}")
     return sorted_bam_path
 
+# region shards for call_variants_bcftools; opt in per call, since the tools already run
+# inside execute_plan's and batch_generate's pools
+CALL_SHARDS = 1
+MIN_REGION_BP = 1000
+
+
+def _fai_regions(fai_path: str, num_shards: int) -> list[str]:
+    """Splits the reference into about `num_shards` regions of equal size, in .fai order."""
+    contigs = []
+    with open(fai_path) as f:
+        for line in f:
+            name, length = line.split("\t")[:2]
+            contigs.append((name, int(length)))
+    total = sum(length for _, length in contigs)
+    shard_bp = max(MIN_REGION_BP, -(-total // max(num_shards, 1)))
+    regions = []
+    for name, length in contigs:
+        for start in range(1, length + 1, shard_bp):
+            regions.append(f"{name}:{start}-{min(start + shard_bp - 1, length)}")
+    return regions
+
+
 @tool
-def call_variants_bcftools(sorted_bam: str, reference_fasta: str) -> str:
+def call_variants_bcftools(sorted_bam: str, reference_fasta: str, shards: int = CALL_SHARDS) -> str:
     print(f"Calling variants from {sorted_bam}...")
-    vcf_path = os.path.join(WORKSPACE_DIR, "variants.vcf.gz")
-    if not os.path.exists(reference_fasta + ".fai"):
-        subprocess.run(["conda", "run", "-n", "bio_agent_env", "samtools", "faidx", reference_fasta], check=True)
-    cmd_mpileup = ["conda", "run", "-n", "bio_agent_env", "bcftools", "mpileup", "-f", reference_fasta, sorted_bam]
-    cmd_call = ["conda", "run", "-n", "bio_agent_env", "bcftools", "call", "-mv", "-Oz", "-o", vcf_path]
-
-    p1 = subprocess.Popen(cmd_mpileup, stdout=subprocess.PIPE)
-    p2 = subprocess.run(cmd_call, stdin=p1.stdout, capture_output=True, text=True)
-    p1.stdout.close()
-    
-    if p2.returncode != 0:
-        raise RuntimeError(f"bcftools failed: {p2.stderr}")
-    subprocess.run(["conda", "run", "-n", "bio_agent_env","bcftools", "index", vcf_path], check=True)
+    vcf_path = workspace_path("variants.vcf.gz")
+    indexed_fasta = reference_index(reference_fasta, "faidx")
+    cmd_mpileup = ["bcftools", "mpileup", "-f", indexed_fasta, sorted_bam]
+    cmd_call = ["bcftools", "call", "-mv"]
+
+    regions = _fai_regions(indexed_fasta + ".fai", shards) if shards > 1 else []
+    if len(regions) <= 1:
+        runner.run_pipeline("bio_agent_env", [cmd_mpileup, cmd_call + ["-Oz", "-o", vcf_path]])
+    else:
+        # each region is an independent mpileup | call process pair; a site belongs to exactly
+        # one region, so the concatenated records equal the serial run's
+        if not any(os.path.exists(sorted_bam + ext) for ext in (".bai", ".csi")):
+            # region queries need an index; build it in scratch rather than next to the input
+            bai_path = scratch_path("call_input.bam.bai")
+            runner.run_pipeline("bio_agent_env", [["samtools", "index", sorted_bam, bai_path]])
+            cmd_mpileup[-1] = f"{sorted_bam}##idx##{bai_path}"
+        shard_paths = [scratch_path(f"variants.shard{i:05d}.bcf") for i in range(len(regions))]
+        with ThreadPoolExecutor(max_workers=min(shards, len(regions))) as pool:
+            list(pool.map(
+                lambda job: runner.run_pipeline("bio_agent_env", [
+                    cmd_mpileup[:2] + ["-r", job[0]] + cmd_mpileup[2:],
+                    cmd_call + ["-Ob", "-o", job[1]],
+                ]),
+                zip(regions, shard_paths),
+            ))
+        # regions are in reference order, so concatenating them keeps the VCF sorted
+        runner.run_pipeline("bio_agent_env", [["bcftools", "concat", "-Oz", "-o", vcf_path, *shard_paths]])
+        for path in shard_paths:
+            os.remove(path)
+    runner.run_pipeline("bio_agent_env", [["bcftools", "index", "-f", vcf_path]])
 
     print(f"Variants called. VCF file at: {vcf_path}")
     return vcf_path
 
-@tool
-def simulate_variants_msprime(sample_size: int = 10, length: int = 10000) -> str:
+MSPRIME_WORKERS = os.cpu_count() or 1
+
+
+def _vcf_positions(positions, length: int):
+    # discrete-genome sites are 0-based; VCF positions start at 1. tskit also transforms the
+    # sequence length for the ##contig header, hence the clamp to `length`
+    return np.minimum(np.round(positions).astype(int) + 1, length)
+
 
-    print(f"Simulating variants for {sample_size} samples with msprime...")
-    vcf_path = os.path.join(WORKSPACE_DIR, "msprime_sim.vcf")
+class _ContigIdWriter:
+    """
+    Text stream for tskit's write_vcf that prefixes the ID column with the contig id. tskit
+    numbers sites from 0 in every tree sequence, so chromosomes simulated separately would
+    otherwise repeat IDs once concatenated. write_vcf prints records in pieces, so partial
+    lines are held back until their newline arrives.
+    """
 
+    def __init__(self, out, contig_id: str):
+        self.out = out
+        self.prefix = contig_id + "_"
+        self.pending = ""
+
+    def write(self, text: str) -> int:
+        *lines, self.pending = (self.pending + text).split("\n")
+        for line in lines:
+            if not line.startswith("#"):
+                chrom, pos, site_id, rest = line.split("\t", 3)
+                line = f"{chrom}\t{pos}\t{self.prefix}{site_id}\t{rest}"
+            self.out.write(line + "\n")
+        return len(text)
+
+    def flush(self):
+        self.out.flush()
+
+
+def _simulate_chromosome(task):
+    """
+    One independent chromosome: sim_ancestry + sim_mutations, optionally dumped to .trees,
+    then streamed to a VCF (through bgzip when `bgzip_cmd` is given) with IDs "<contig_id>_<site>".
+    Runs in a spawned worker.
+    """
+    (contig_id, sample_size, length, population_size, recombination_rate, mutation_rate,
+     seeds, trees_path, vcf_path, bgzip_cmd, environ) = task
     ts = msprime.sim_ancestry(
-        samples=sample_size, 
-        population_size=10_000, 
-        sequence_length=length, 
-        recombination_rate=1e-8,
-        random_seed=42
+        samples=sample_size,
+        population_size=population_size,
+        sequence_length=length,
+        recombination_rate=recombination_rate,
+        random_seed=seeds[0]
     )
-    mts = msprime.sim_mutations(ts, rate=1e-8, random_seed=42)
-    with open(vcf_path, "w") as vcf_file:
-        mts.write_vcf(vcf_file, contig_id="sim_contig")
-    print(f"Variants simulated by msprime at: {vcf_path}")
+    mts = msprime.sim_mutations(ts, rate=mutation_rate, random_seed=seeds[1])
+    if trees_path:
+        mts.dump(trees_path)
+    to_vcf = functools.partial(_vcf_positions, length=int(length))
+    if bgzip_cmd is None:
+        with open(vcf_path, "w") as vcf_file:
+            mts.write_vcf(_ContigIdWriter(vcf_file, contig_id), contig_id=contig_id, position_transform=to_vcf)
+    else:
+        with open(vcf_path, "wb") as out:
+            proc = subprocess.Popen(bgzip_cmd, stdin=subprocess.PIPE, stdout=out, env=environ)
+            with io.TextIOWrapper(proc.stdin, write_through=False) as pipe:
+                mts.write_vcf(_ContigIdWriter(pipe, contig_id), contig_id=contig_id, position_transform=to_vcf)
+            if proc.wait() != 0:
+                raise RuntimeError(f"bgzip failed for {vcf_path}")
+    return mts.num_sites
+
+
+def _vcf_header(path):
+    header = []
+    with open(path) as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            header.append(line)
+    return header
+
+
+def _concat_plain_vcfs(paths, out_path):
+    """Header of the first shard with every shard's ##contig line, then all records in order."""
+    contigs = [line for path in paths for line in _vcf_header(path) if line.startswith("##contig")]
+    with open(out_path, "w") as out:
+        for line in _vcf_header(paths[0]):
+            if line.startswith("##contig"):
+                out.writelines(contigs)
+                contigs = []
+            else:
+                out.write(line)
+        for path in paths:
+            with open(path) as f:
+                out.writelines(line for line in f if not line.startswith("#"))
+
+
+@tool
+def simulate_variants_msprime(
+    sample_size: int = 10,
+    length: int = 10000,
+    num_chromosomes: int = 1,
+    recombination_rate: float = 1e-8,
+    mutation_rate: float = 1e-8,
+    population_size: int = 10_000,
+    seed: int = 42,
+    save_trees: bool = False,
+    bgzip: bool = False,
+    workers: int = MSPRIME_WORKERS
+) -> str:
+    """
+    Simulates variants for `sample_size` diploid individuals with msprime. With
+    num_chromosomes > 1, independent chromosomes of `length` bp are simulated in parallel
+    with seeds derived from `seed`. Optionally keeps the .trees files and writes a bgzipped,
+    indexed VCF. Returns the path to the VCF.
+    """
+    print(f"Simulating variants for {sample_size} samples x {num_chromosomes} chromosome(s) with msprime...")
+    vcf_path = workspace_path("msprime_sim.vcf.gz" if bgzip else "msprime_sim.vcf")
+    # independent, reproducible (ancestry, mutation) seed pairs per chromosome
+    seeds = [
+        [int(x) % (2**32 - 1) + 1 for x in child.generate_state(2)]
+        for child in np.random.SeedSequence(seed).spawn(num_chromosomes)
+    ]
+    bgzip_cmd = runner.command("bio_agent_env", ["bgzip", "-c"]) if bgzip else None
+    environ = runner.conda_environ("bio_agent_env") if bgzip else None
+    tasks = []
+    for i in range(num_chromosomes):
+        contig_id = "sim_contig" if num_chromosomes == 1 else f"sim_contig{i + 1}"
+        trees_path = workspace_path(f"msprime_sim.{contig_id}.trees") if save_trees else None
+        shard_path = vcf_path if num_chromosomes == 1 else scratch_path(f"msprime_sim.{contig_id}.vcf" + (".gz" if bgzip else ""))
+        tasks.append((contig_id, sample_size, length, population_size, recombination_rate, mutation_rate,
+                      seeds[i], trees_path, shard_path, bgzip_cmd, environ))
+
+    if num_chromosomes == 1 or workers <= 1:
+        num_sites = [_simulate_chromosome(task) for task in tasks]
+    else:
+        # spawn: this runs inside execute_plan's thread pool, where forking is unsafe
+        with ProcessPoolExecutor(max_workers=min(workers, num_chromosomes),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            num_sites = list(pool.map(_simulate_chromosome, tasks))
+
+    shards = [task[8] for task in tasks]
+    if num_chromosomes > 1:
+        if bgzip:
+            runner.run_pipeline("bio_agent_env", [["bcftools", "concat", "--no-version", "-Oz", "-o", vcf_path, *shards]])
+        else:
+            _concat_plain_vcfs(shards, vcf_path)
+        for shard in shards:
+            os.remove(shard)
+    if bgzip:
+        runner.run_pipeline("bio_agent_env", [["bcftools", "index", "-t", "-f", vcf_path]])
+    print(f"Variants simulated by msprime at: {vcf_path} ({sum(num_sites)} sites)")
     return vcf_path
@@ -0,0 +1,112 @@
+import os
+import shutil
+import contextvars
+from typing import Optional
+
+WORKSPACE_DIR = "./workspace"
+# Intermediate files go to tmpfs when it has room; override with BIOGEN_SCRATCH=<dir>
+SCRATCH_CANDIDATES = [os.environ.get("BIOGEN_SCRATCH"), "/dev/shm"]
+SCRATCH_MIN_FREE = 2 * 1024 ** 3
+CLEANUP_POLICIES = ("scratch", "all", "none")
+
+_current = contextvars.ContextVar("biogen_workspace", default=None)
+
+
+def _pick_scratch_root(min_free: int = SCRATCH_MIN_FREE) -> Optional[str]:
+    for candidate in SCRATCH_CANDIDATES:
+        if candidate and os.path.isdir(candidate) and os.access(candidate, os.W_OK):
+            if shutil.disk_usage(candidate).free >= min_free:
+                return candidate
+    return None
+
+
+class Workspace:
+    """
+    Per-task output directory for the synthesis tools.
+
+    Outputs that end up in a benchmark go to `<root>/<task_id>/`; intermediates (SAM files,
+    unsorted BAMs, simulator references...) go to a scratch directory, on tmpfs if available.
+    The tools find the active workspace through a context variable, so concurrent tasks never
+    see each other's files:
+
+        with Workspace("medium-12"):
+            agent.execute_plan(plan)
+
+    cleanup: "scratch" removes the scratch directory on exit, "all" also removes the task
+    directory, "none" keeps everything (useful for debugging a tool).
+    """
+
+    def __init__(self, task_id: str, root: str = WORKSPACE_DIR, scratch_root: Optional[str] = None, cleanup: str = "scratch"):
+        if cleanup not in CLEANUP_POLICIES:
+            raise ValueError(f"cleanup must be one of {CLEANUP_POLICIES}, got {cleanup!r}")
+        self.task_id = task_id
+        self.dir = os.path.join(root, task_id)
+        scratch_root = scratch_root or _pick_scratch_root()
+        scratch_name = f"biogen-{os.getpid()}-{task_id}"
+        self.scratch_dir = os.path.join(scratch_root, scratch_name) if scratch_root else os.path.join(self.dir, ".scratch")
+        self.cleanup = cleanup
+        self._token = None
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, name)
+
+    def scratch_path(self, name: str) -> str:
+        return os.path.join(self.scratch_dir, name)
+
+    def step(self, name: str) -> "Workspace":
+        """
+        Sub-workspace `<dir>/<name>` for one plan step. Tools write fixed file names, so steps
+        running in parallel (or two steps of the same tool) each need their own directory.
+        """
+        return _StepWorkspace(self, name)
+
+    def __enter__(self):
+        os.makedirs(self.dir, exist_ok=True)
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        if self.cleanup in ("scratch", "all"):
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        if self.cleanup == "all":
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class _SharedWorkspace(Workspace):
+    """Used when no Workspace is active: the old single ./workspace directory."""
+
+    def __init__(self):
+        self.task_id = None
+        self.dir = self.scratch_dir = WORKSPACE_DIR
+        self.cleanup = "none"
+
+
+class _StepWorkspace(Workspace):
+    """Directories inside a parent workspace; the parent's cleanup policy removes them."""
+
+    def __init__(self, parent: Workspace, name: str):
+        self.task_id = parent.task_id
+        self.dir = os.path.join(parent.dir, name)
+        self.scratch_dir = os.path.join(parent.scratch_dir, name)
+        self.cleanup = "none"
+        self._token = None
+
+
+def current_workspace() -> Workspace:
+    workspace = _current.get()
+    if workspace is None:
+        workspace = _SharedWorkspace()
+        os.makedirs(workspace.dir, exist_ok=True)
+    return workspace
+
+
+def workspace_path(name: str) -> str:
+    """Path for a tool output in the active task workspace."""
+    return current_workspace().path(name)
+
+
+def scratch_path(name: str) -> str:
+    """Path for an intermediate file that nothing outside the tool needs to read."""
+    return current_workspace().scratch_path(name)
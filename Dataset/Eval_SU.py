@@ -1,18 +1,38 @@
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel,Field
 from typing import Optional, List, Union, Dict, Any, Literal
 import json
 import os
 import time
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-from langchain_core.output_parsers import PydanticOutputParser
 import re
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, classification_report
 
 import os
+from eval_engine import EvalSession, make_http_clients
+from response_cache import ResponseCache, cached_llm
+from results_store import ResultsWriter, read_done_ids
+from dataset_index import DatasetView, IndexedDataset
+from answer_extract import SLIM_FORMAT_INSTRUCTIONS, AnswerExtractor, ParseStats, count_tokens
 
 file_list = ["./Syntax_Understanding.json"]
+RESULTS_DIR = "./results"  # one <dataset>.results.jsonl per file; re-running resumes from it
+
+# Concurrency settings for the async runner
+MAX_CONCURRENCY = 32
+RATE_LIMIT = None  # max requests started per second, None for unlimited
+REQUEST_TIMEOUT = 120.0
+
+# Response cache: re-runs answer from here instead of the API. REPLAY=True never calls the API.
+CACHE_PATH = "./llm_cache.sqlite"  # None to disable
+CACHE_MAX_ENTRIES = None  # LRU bound on cached responses, None for unbounded
+REPLAY = False
+
+# Replace the verbose Pydantic format instructions with a one-line JSON hint
+SLIM_PROMPT = False
+
+# Offline evaluation with a local causal LM instead of the API (e.g. "/models/Qwen2.5-7B-Instruct").
+LOCAL_MODEL_PATH = None
+LOCAL_BATCH_SIZE = 8
+# With a local model: pick the option letter by next-token log-likelihood (one forward pass, no parsing)
+LETTER_SCORING = True
 
 class QuestionAnswer(BaseModel):
     correct_option: Literal["A", "B", "C", "D"] = Field(description="The key of the correct option (A, B, C, or D)")
@@ -29,77 +49,191 @@ Instructions:
 2. The output must strictly follow the format: {format_instructions}
 '''
 
+letter_prompt_template = '''
+You are a bioinformatics expert. 
+Answer the following multiple-choice question with the letter of the correct option only.
+Question: 
+{question}
+Options:
+{options_str}
+'''
+
 class ExamAgent:
-    def __init__(self, temperature: float = 0.1):
+    def __init__(
+        self,
+        temperature: float = 0.1,
+        base_url: str = "",
+        api_key: str = "",
+        model: str = "",
+        max_connections: int = 64,
+        cache: Optional[ResponseCache] = None,
+        llm=None,
+        slim_prompt: bool = False,
+        letter_scoring: bool = False,
+    ):
+        # LLM backends are imported here so that scoring/replay-only paths start fast
+        from langchain_core.prompts import ChatPromptTemplate
+        from langchain_core.output_parsers import PydanticOutputParser
+        from langchain_openai import ChatOpenAI
+        from langchain_core.runnables import RunnableLambda
+
         self.parser = PydanticOutputParser(pydantic_object=QuestionAnswer)
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", exam_prompt_template)
         ])
-        
-        # 配置 LLM
-        self.llm = ChatOpenAI(
-            base_url="",
-            api_key="",
-            model="",
-            temperature=temperature
-        )
+        self.format_instructions = self.parser.get_format_instructions()
+        # replies go through a regex/JSON fast path; the Pydantic parser is only the fallback
+        self.extractor = AnswerExtractor(QuestionAnswer, "correct_option", fallback_parser=self.parser)
+        self.tokens_saved_per_prompt = 0
+        if slim_prompt:
+            slim = SLIM_FORMAT_INSTRUCTIONS["correct_option"]
+            self.tokens_saved_per_prompt = count_tokens(self.format_instructions) - count_tokens(slim)
+            self.format_instructions = slim
 
-    def solve(self, question: str, options: Dict[str, str]):
+        if llm is not None:
+            # pluggable backend, e.g. local_backend.LocalCausalLM
+            self.http_client = self.http_async_client = None
+            self.llm = llm
+        else:
+            self.http_client, self.http_async_client = make_http_clients(max_connections)
+            # 配置 LLM
+            self.llm = ChatOpenAI(
+                base_url=base_url,
+                api_key=api_key,
+                model=model,
+                temperature=temperature,
+                http_client=self.http_client,
+                http_async_client=self.http_async_client,
+            )
+        # letter scoring needs a backend with score_letters (LocalCausalLM)
+        self.letter_scoring = letter_scoring
+        self.letter_prompt = ChatPromptTemplate.from_messages([
+            ("system", letter_prompt_template)
+        ])
+        self.cache = cache
+        if cache is not None:
+            self.chain = self.prompt | cached_llm(self.llm, cache) | RunnableLambda(self.parse)
+        else:
+            self.chain = self.prompt | self.llm | RunnableLambda(self.parse)
+
+    def parse(self, output) -> QuestionAnswer:
+        self.extractor.stats.prompt_tokens_saved += self.tokens_saved_per_prompt
+        return self.extractor(output)
+
+    def build_inputs(self, question: str, options: Dict[str, str]) -> Dict[str, str]:
         options_str = "\n".join([f"{k}: {v}" for k, v in options.items()])
-        
-        chain = self.prompt | self.llm | self.parser
+        return {
+            "question": question, 
+            "options_str": options_str, 
+            "format_instructions": self.format_instructions
+        }
+
+    def solve(self, question: str, options: Dict[str, str]):
         try:
-            result = chain.invoke({
-                "question": question, 
-                "options_str": options_str, 
-                "format_instructions": self.parser.get_format_instructions()
-            })
-            return result
+            if self.letter_scoring:
+                prompt_value = self.letter_prompt.invoke(self.build_inputs(question, options))
+                letters = "".join(options)
+                return QuestionAnswer(correct_option=self.llm.score_letters([self.llm.render(prompt_value)], letters)[0])
+            return self.chain.invoke(self.build_inputs(question, options))
         except Exception as e:
             print(f"Error during inference: {e}")
             return None
 
+    async def asolve(self, question: str, options: Dict[str, str]):
+        if self.letter_scoring:
+            prompt_value = self.letter_prompt.invoke(self.build_inputs(question, options))
+            return QuestionAnswer(correct_option=await self.llm.ascore_letters(prompt_value, "".join(options)))
+        return await self.chain.ainvoke(self.build_inputs(question, options))
+
+    async def asolve_item(self, item: Dict[str, Any]):
+        return await self.asolve(item["question"], item["options"])
+
+_agent = None
+
+def get_agent() -> ExamAgent:
+    global _agent
+    if _agent is None:
+        cache = ResponseCache(CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, replay=REPLAY) if CACHE_PATH else None
+        if LOCAL_MODEL_PATH:
+            from local_backend import LocalCausalLM
+
+            llm = LocalCausalLM(LOCAL_MODEL_PATH, batch_size=LOCAL_BATCH_SIZE)
+            _agent = ExamAgent(cache=cache, llm=llm, letter_scoring=LETTER_SCORING, slim_prompt=SLIM_PROMPT)
+        else:
+            _agent = ExamAgent(cache=cache, slim_prompt=SLIM_PROMPT)
+    return _agent
+
 def answer_question(question: str, options: Dict[str, str]):
-    agent = ExamAgent()
-    result = agent.solve(question, options)
+    result = get_agent().solve(question, options)
     
     if result is None:
         return None
     else:
         return result.model_dump()
 
-def get_score(y_true,y_pred):
-    acc = accuracy_score(y_true, y_pred)
-    p_macro = precision_score(y_true, y_pred, average='macro', zero_division=0)
-    r_macro = recall_score(y_true, y_pred, average='macro', zero_division=0)
-    f1_macro = f1_score(y_true, y_pred, average='macro', zero_division=0)
-    return acc, p_macro, r_macro, f1_macro
+def get_score(results_path: str):
+    """Accuracy and macro P/R/F1 (sklearn semantics, zero_division=0) over a results file."""
+    from scoring import score_results
+
+    metrics = score_results(results_path)
+    return metrics["acc"], metrics["p_macro"], metrics["r_macro"], metrics["f1_macro"]
+
+def get_score_by_type(results_path: str) -> Dict[str, Dict[str, float]]:
+    from scoring import score_results_by
+
+    return score_results_by(results_path, "type")
+
+def make_record(item: Dict[str, Any], result: QuestionAnswer) -> Dict[str, Any]:
+    return {
+        "id": item["id"],
+        "type": item.get("type"),
+        # older items use "answer", newer ones "correct_answer"
+        "answer": item.get("answer", item.get("correct_answer")),
+        "prediction": result.correct_option,
+    }
+
+def answer_questions(session: EvalSession, data: DatasetView, results_path: str) -> int:
+    """
+    Answers the items not yet in `results_path` concurrently, appending each answered item
+    to the results file as it completes. Returns the number of items answered in this run.
+    """
+    done = read_done_ids(results_path)
+    todo = data.exclude_ids(done)
+    if done:
+        print(f"Resuming {results_path}: {len(done)} done, {len(todo)} remaining")
+    progress = tqdm.tqdm(total=len(todo))
+    answered = 0
+    with ResultsWriter(results_path) as writer:
+        def on_done(i, result):
+            nonlocal answered
+            progress.update(1)
+            if result is None:
+                return
+            writer.append(make_record(todo[i], result))
+            answered += 1
+
+        session.solve_many(todo, on_done=on_done)
+    progress.close()
+    return answered
 
 import tqdm
 if __name__ == "__main__":
     data1 = {}
     count = 0
-    y_true = []
-    y_pred = []
-    wrong_set = []
+    session = EvalSession(get_agent(), concurrency=MAX_CONCURRENCY, rate_limit=RATE_LIMIT, timeout=REQUEST_TIMEOUT)
     for file in file_list:
-        y_true = []
-        y_pred = []
-        data = json.load(open(file, "r"))
-        for item in tqdm.tqdm(data):
-            question = item["question"]
-            options = item["options"]
-            answer = item["answer"]
-            result = answer_question(question, options)
-            if result:
-                y_true.append(answer)
-                y_pred.append(result["correct_option"])
-                if(answer != result["correct_option"]):
-                    wrong_set.append(item)
-        acc, p_macro, r_macro, f1_macro = get_score(y_true, y_pred)
+        data = IndexedDataset(file)
+        results_path = os.path.join(RESULTS_DIR, os.path.basename(file).replace(".json", ".results.jsonl"))
+        session.agent.extractor.stats = ParseStats()
+        answer_questions(session, data, results_path)
+        print("parse stats:", session.agent.extractor.stats.summary())
+        acc, p_macro, r_macro, f1_macro = get_score(results_path)
         print(file)
         print(acc, p_macro, r_macro, f1_macro)
+        for question_type, m in get_score_by_type(results_path).items():
+            print(f"  {question_type}: n={m['n']} acc={m['acc']:.4f} p={m['p_macro']:.4f} r={m['r_macro']:.4f} f1={m['f1_macro']:.4f}")
         data1[str(count)] = {"acc": acc, "p_macro": p_macro, "r_macro": r_macro, "f1_macro": f1_macro}
+        data.close()
         count+=1
-    print(data1)  
-    
+    session.close()
+    print(data1)
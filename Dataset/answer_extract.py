@@ -0,0 +1,119 @@
+"""
+Cheap answer extraction for the single-field evaluator schemas (correct_option / BLANK).
+A JSON or regex fast path handles the usual replies; the full PydanticOutputParser is only
+used when that fails. Counts how each reply was parsed so every run can report failure rates.
+"""
+import json
+import re
+from typing import Any, Dict, Optional, Type
+
+from pydantic import BaseModel
+
+SLIM_FORMAT_INSTRUCTIONS = {
+    "correct_option": 'Reply with JSON only: {"correct_option": "<A|B|C|D>"}',
+    "BLANK": 'Reply with JSON only: {"BLANK": "<value>"}',
+}
+
+_FENCE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.S)
+_BARE_OPTION = re.compile(r"^\W*([A-D])\W*$")
+# "the answer is B" states the choice; "option D" may just be discussed, so it only counts
+# when no "answer" phrase is present
+_ANSWER_IS = re.compile(r"(?i:answer)\s*(?i:is|:)?\s*[\(\"']?([A-D])\b")
+_OPTION = re.compile(r"(?i:option)\s*(?i:is|:)?\s*[\(\"']?([A-D])\b")
+
+
+def count_tokens(text: str) -> int:
+    try:
+        import tiktoken
+
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    except Exception:
+        # offline without the tiktoken vocabulary: rough estimate
+        return max(1, len(text) // 4)
+
+
+class ParseStats:
+    def __init__(self):
+        self.fast = 0
+        self.fallback = 0
+        self.failed = 0
+        self.prompt_tokens_saved = 0
+
+    @property
+    def total(self) -> int:
+        return self.fast + self.fallback + self.failed
+
+    def summary(self) -> Dict[str, Any]:
+        total = max(self.total, 1)
+        return {
+            "replies": self.total,
+            "fast_path": self.fast,
+            "fallback": self.fallback,
+            "failed": self.failed,
+            "failure_rate": self.failed / total,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+        }
+
+
+class AnswerExtractor:
+    """
+    Callable turning a raw reply (string or chat message) into `model_cls`, whose single
+    field is `field`. Raises like the Pydantic parser when nothing can be extracted.
+    """
+
+    def __init__(self, model_cls: Type[BaseModel], field: str, fallback_parser=None):
+        self.model_cls = model_cls
+        self.field = field
+        self.fallback_parser = fallback_parser
+        self.stats = ParseStats()
+        self._field_value = re.compile(r'"%s"\s*:\s*("(?:[^"\\]|\\.)*"|[-+0-9.eE]+)' % re.escape(field))
+
+    def _fast(self, text: str) -> Optional[Any]:
+        body = text.strip()
+        fenced = _FENCE.match(body)
+        if fenced:
+            body = fenced.group(1)
+        if body.startswith("{"):
+            try:
+                value = json.loads(body).get(self.field)
+                if value is not None:
+                    return value
+            except (ValueError, AttributeError):
+                pass
+        match = self._field_value.search(body)
+        if match:
+            try:
+                return json.loads(match.group(1))
+            except ValueError:
+                pass
+        if self.field == "correct_option":
+            match = _BARE_OPTION.match(body)
+            if match:
+                return match.group(1)
+            match = _ANSWER_IS.search(body)
+            if match:
+                return match.group(1)
+            matches = _OPTION.findall(body)
+            if matches:
+                return matches[-1]
+        return None
+
+    def __call__(self, output) -> BaseModel:
+        text = output if isinstance(output, str) else output.content
+        value = self._fast(text)
+        if value is not None:
+            try:
+                result = self.model_cls(**{self.field: value if self.field == "correct_option" else str(value)})
+                self.stats.fast += 1
+                return result
+            except ValueError:
+                pass
+        try:
+            if self.fallback_parser is None:
+                raise ValueError(f"Could not extract '{self.field}' from: {text[:200]!r}")
+            result = self.fallback_parser.parse(text)
+        except Exception:
+            self.stats.failed += 1
+            raise
+        self.stats.fallback += 1
+        return result
@@ -0,0 +1,93 @@
+"""
+Micro-benchmarks for the evaluation harness. Runs against an in-process mock OpenAI server,
+so the numbers measure client-side overhead rather than model latency.
+
+    python bench_eval.py agent_reuse [n_items]
+    python bench_eval.py importtime [module ...]
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from mock_openai_server import make_handler
+
+
+def start_mock_server(reply: str = '{"correct_option": "A"}', delay: float = 0.0) -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(reply, delay))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def bench_agent_reuse(n_items: int = 200):
+    """Per-item cost of building a new ExamAgent for every question vs. reusing one agent."""
+    import Eval_SU
+
+    base_url = start_mock_server()
+    config = dict(base_url=base_url, api_key="mock", model="mock")
+    with open("./Syntax_Understanding.json", "r") as f:
+        data = json.load(f)[:n_items]
+
+    start = time.perf_counter()
+    for item in data:
+        agent = Eval_SU.ExamAgent(**config)
+        agent.solve(item["question"], item["options"])
+    rebuild = (time.perf_counter() - start) / len(data)
+
+    agent = Eval_SU.ExamAgent(**config)
+    start = time.perf_counter()
+    for item in data:
+        agent.solve(item["question"], item["options"])
+    reuse = (time.perf_counter() - start) / len(data)
+
+    print(f"agent per item : {rebuild * 1000:8.2f} ms/item")
+    print(f"shared agent   : {reuse * 1000:8.2f} ms/item")
+    print(f"speedup        : {rebuild / reuse:8.2f}x")
+
+
+IMPORT_BUDGET_MS = 500
+
+
+def bench_import_time(modules=("Eval_SU", "Eval_CA")):
+    """Cold import cost of the evaluator modules, measured with `python -X importtime`."""
+    for module in modules:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"importing {module} failed: {proc.stderr.splitlines()[-1]}")
+        # -X importtime prints children before their parent; direct imports are indented by 2
+        children = []
+        total_ms = None
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            _, cumulative, name = line.split("|")
+            if not cumulative.strip().isdigit():
+                continue
+            depth = len(name) - len(name.lstrip()) - 1
+            if depth == 0 and name.strip() == module:
+                total_ms = int(cumulative) / 1000
+                break
+            if depth == 0:
+                children = []
+            elif depth == 2:
+                children.append((int(cumulative), name.strip()))
+        top_level = sorted(children, reverse=True)[:5]
+        status = "ok" if total_ms <= IMPORT_BUDGET_MS else f"OVER BUDGET ({IMPORT_BUDGET_MS} ms)"
+        print(f"{module}: {total_ms:.1f} ms [{status}]")
+        for us, name in top_level:
+            print(f"    {us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "agent_reuse"
+    if name == "agent_reuse":
+        bench_agent_reuse(int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+    elif name == "importtime":
+        bench_import_time(sys.argv[2:] or ("Eval_SU", "Eval_CA"))
+    else:
+        raise SystemExit(f"unknown benchmark '{name}'")
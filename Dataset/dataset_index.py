@@ -0,0 +1,152 @@
+"""
+Indexed, memory-mapped access to the benchmark JSON files.
+
+The first time a dataset is opened, the JSON array is converted to `<name>.jsonl` plus a
+`<name>.idx.json` sidecar holding byte offsets and the `id`/`type`/`tool_name` columns.
+Later opens only read the sidecar: records are parsed lazily from the memory-mapped JSONL,
+lookups by `id` and filters by `type`/`tool_name` never touch the records, and views
+(filters, shards) pickle as (path, positions) so they can be handed to worker processes.
+"""
+import json
+import mmap
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+
+def _paths(json_path: str):
+    stem = os.path.splitext(json_path)[0]
+    return stem + ".jsonl", stem + ".idx.json"
+
+
+def _source_signature(json_path: str) -> Dict[str, int]:
+    st = os.stat(json_path)
+    return {"source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns}
+
+
+def _atomic_write(path: str, data: bytes):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_index(json_path: str) -> Dict[str, Any]:
+    """Converts a JSON array file to JSONL + offset index. Safe to run from several processes."""
+    jsonl_path, index_path = _paths(json_path)
+    with open(json_path, "r") as f:
+        records = json.load(f)
+
+    lines, offsets = [], [0]
+    for record in records:
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        lines.append(line)
+        offsets.append(offsets[-1] + len(line))
+    index = {
+        **_source_signature(json_path),
+        "offsets": offsets,
+        "ids": [r.get("id") for r in records],
+        "types": [r.get("type") for r in records],
+        "tool_names": [r.get("tool_name") for r in records],
+    }
+    _atomic_write(jsonl_path, b"".join(lines))
+    _atomic_write(index_path, json.dumps(index).encode("utf-8"))
+    return index
+
+
+class DatasetView:
+    """An ordered selection of records from an IndexedDataset."""
+
+    def __init__(self, dataset: "IndexedDataset", positions: Sequence[int]):
+        self.dataset = dataset
+        self.positions = positions
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return self.dataset.record(self.positions[i])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for position in self.positions:
+            yield self.dataset.record(position)
+
+    @property
+    def ids(self) -> List[str]:
+        return [self.dataset.index["ids"][p] for p in self.positions]
+
+    def filter(self, type: Optional[str] = None, tool_name: Optional[str] = None) -> "DatasetView":
+        index = self.dataset.index
+        positions = [
+            p for p in self.positions
+            if (type is None or index["types"][p] == type) and (tool_name is None or index["tool_names"][p] == tool_name)
+        ]
+        return DatasetView(self.dataset, positions)
+
+    def exclude_ids(self, ids: Iterable[str]) -> "DatasetView":
+        ids = set(ids)
+        return DatasetView(self.dataset, [p for p in self.positions if self.dataset.index["ids"][p] not in ids])
+
+    def shard(self, num_shards: int, shard_id: int) -> "DatasetView":
+        """Contiguous shard `shard_id` of `num_shards` (contiguous keeps each worker's reads sequential)."""
+        size, extra = divmod(len(self.positions), num_shards)
+        start = shard_id * size + min(shard_id, extra)
+        end = start + size + (1 if shard_id < extra else 0)
+        return DatasetView(self.dataset, self.positions[start:end])
+
+
+class IndexedDataset(DatasetView):
+    def __init__(self, json_path: str):
+        self.json_path = json_path
+        self.jsonl_path, self.index_path = _paths(json_path)
+        self.index = self._load_index()
+        self._file = None
+        self._mm = None
+        super().__init__(self, range(len(self.index["ids"])))
+
+    def _load_index(self) -> Dict[str, Any]:
+        if os.path.exists(self.index_path) and os.path.exists(self.jsonl_path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            signature = _source_signature(self.json_path)
+            if all(index.get(k) == v for k, v in signature.items()):
+                return index
+        return build_index(self.json_path)
+
+    def _mmap(self) -> mmap.mmap:
+        if self._mm is None:
+            self._file = open(self.jsonl_path, "rb")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def record(self, position: int) -> Dict[str, Any]:
+        offsets = self.index["offsets"]
+        return json.loads(self._mmap()[offsets[position]:offsets[position + 1]])
+
+    def get(self, item_id: str) -> Dict[str, Any]:
+        if not hasattr(self, "_positions_by_id"):
+            self._positions_by_id = {i: p for p, i in enumerate(self.index["ids"])}
+        return self.record(self._positions_by_id[item_id])
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getstate__(self):
+        # ship only the path; the index and the mmap are reopened in the receiving process
+        state = self.__dict__.copy()
+        state["_file"] = state["_mm"] = state["index"] = None
+        state.pop("_positions_by_id", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.index = self._load_index()
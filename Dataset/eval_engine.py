@@ -0,0 +1,121 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Sequence
+
+
+class TokenBucket:
+    """Async token bucket: allows `rate` requests per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def run_concurrent(
+    solve_fn: Callable[[Any], Awaitable[Any]],
+    items: Sequence[Any],
+    concurrency: int = 16,
+    rate_limit: Optional[float] = None,
+    timeout: Optional[float] = 120.0,
+    on_done: Optional[Callable[[int, Any], None]] = None,
+) -> List[Any]:
+    """
+    Runs `solve_fn(item)` for every item with at most `concurrency` requests in flight,
+    at most `rate_limit` requests started per second and a per-request `timeout` in seconds.
+    Results are returned in the original order of `items`; failed or timed-out items give None.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate_limit) if rate_limit else None
+
+    async def worker(index, item):
+        async with semaphore:
+            if bucket is not None:
+                await bucket.acquire()
+            try:
+                result = await asyncio.wait_for(solve_fn(item), timeout)
+            except asyncio.TimeoutError:
+                print(f"Error during inference: request timed out after {timeout}s")
+                result = None
+            except Exception as e:
+                print(f"Error during inference: {e}")
+                result = None
+        if on_done is not None:
+            on_done(index, result)
+        return result
+
+    return await asyncio.gather(*(worker(i, item) for i, item in enumerate(items)))
+
+
+def make_http_clients(max_connections: int = 64, timeout: float = 120.0):
+    """Pooled keep-alive HTTP clients to share across every request made by one ChatOpenAI instance."""
+    import httpx
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+class EvalSession:
+    """
+    Holds one agent (LLM client, parser, chain and rendered format instructions) for a whole run
+    and answers batches of dataset items through `run_concurrent`.
+    The agent must provide `asolve_item(item)`.
+    """
+
+    def __init__(
+        self,
+        agent,
+        concurrency: int = 16,
+        rate_limit: Optional[float] = None,
+        timeout: Optional[float] = 120.0,
+    ):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+        # One loop for the session so pooled async connections survive across solve_many() calls
+        self.loop = asyncio.new_event_loop()
+
+    async def asolve_many(self, items: Sequence[Any], on_done: Optional[Callable[[int, Any], None]] = None) -> List[Any]:
+        return await run_concurrent(
+            self.agent.asolve_item,
+            items,
+            concurrency=self.concurrency,
+            rate_limit=self.rate_limit,
+            timeout=self.timeout,
+            on_done=on_done,
+        )
+
+    def solve_many(self, items: Sequence[Any], on_done: Optional[Callable[[int, Any], None]] = None) -> List[Any]:
+        return self.loop.run_until_complete(self.asolve_many(items, on_done))
+
+    def close(self):
+        http_async_client = getattr(self.agent, "http_async_client", None)
+        if http_async_client is not None:
+            self.loop.run_until_complete(http_async_client.aclose())
+        http_client = getattr(self.agent, "http_client", None)
+        if http_client is not None:
+            http_client.close()
+        cache = getattr(self.agent, "cache", None)
+        if cache is not None:
+            cache.close()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
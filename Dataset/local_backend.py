@@ -0,0 +1,157 @@
+"""
+Offline backend: a local Hugging Face causal LM that can stand in for ChatOpenAI in ExamAgent.
+The model is loaded once; concurrent requests from EvalSession are micro-batched into padded
+batches and run on a single worker thread.
+
+transformers/torch are only imported by this module, which the evaluators import on demand.
+"""
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import torch
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import Runnable
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+class LocalCausalLM(Runnable):
+    def __init__(
+        self,
+        model_path: str,
+        device: str = "cpu",
+        batch_size: int = 8,
+        max_new_tokens: int = 64,
+        temperature: float = 0.0,
+        torch_dtype: Optional[str] = None,
+        local_files_only: bool = True,
+        batch_wait: float = 0.01,
+    ):
+        self.model_name = os.path.basename(model_path.rstrip("/"))
+        self.device = device
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.batch_wait = batch_wait
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, padding_side="left", local_files_only=local_files_only)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        dtype_kwargs = {"torch_dtype": getattr(torch, torch_dtype)} if torch_dtype else {}
+        self.model = AutoModelForCausalLM.from_pretrained(model_path, local_files_only=local_files_only, **dtype_kwargs)
+        self.model.to(device).eval()
+
+        # The model is not safe to call from several threads; one worker runs batches in order
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending: Dict[str, List] = {}
+        self._letter_ids: Dict[str, List[List[int]]] = {}
+
+    def render(self, prompt_value) -> str:
+        """Turns a LangChain prompt value into model input text, using the chat template if there is one."""
+        if isinstance(prompt_value, str):
+            return prompt_value
+        if self.tokenizer.chat_template:
+            messages = [{"role": _ROLES.get(m.type, "user"), "content": m.content} for m in prompt_value.to_messages()]
+            return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return prompt_value.to_string()
+
+    def _encode(self, texts: Sequence[str]):
+        # chat templates already contain the special tokens
+        return self.tokenizer(list(texts), return_tensors="pt", padding=True, add_special_tokens=not self.tokenizer.chat_template).to(self.device)
+
+    @torch.inference_mode()
+    def generate(self, texts: Sequence[str]) -> List[str]:
+        outputs = []
+        for start in range(0, len(texts), self.batch_size):
+            enc = self._encode(texts[start:start + self.batch_size])
+            sampling = {"do_sample": True, "temperature": self.temperature} if self.temperature > 0 else {"do_sample": False}
+            generated = self.model.generate(
+                **enc,
+                max_new_tokens=self.max_new_tokens,
+                pad_token_id=self.tokenizer.pad_token_id,
+                **sampling,
+            )
+            new_tokens = generated[:, enc["input_ids"].shape[1]:]
+            outputs.extend(self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True))
+        return outputs
+
+    def _letter_token_ids(self, letters: str) -> List[List[int]]:
+        if letters not in self._letter_ids:
+            ids = []
+            for letter in letters:
+                candidates = {self.tokenizer.encode(variant, add_special_tokens=False)[-1] for variant in (letter, " " + letter)}
+                ids.append(sorted(candidates))
+            self._letter_ids[letters] = ids
+        return self._letter_ids[letters]
+
+    @torch.inference_mode()
+    def score_letters(self, texts: Sequence[str], letters: str = "ABCD") -> List[str]:
+        """
+        Picks the option letter with the highest next-token log-likelihood after each prompt:
+        one forward pass per batch, no generation and no output parsing. Only the letters in
+        `letters` (the item's options) can be chosen.
+        """
+        letter_ids = self._letter_token_ids(letters)
+        flat_ids = torch.tensor([i for ids in letter_ids for i in ids], device=self.device)
+        owners = torch.tensor([k for k, ids in enumerate(letter_ids) for _ in ids], device=self.device)
+        choices = []
+        for start in range(0, len(texts), self.batch_size):
+            enc = self._encode(texts[start:start + self.batch_size])
+            # left padding: position -1 is the last real token of every row
+            logits = self.model(**enc).logits[:, -1, :]
+            logprobs = torch.log_softmax(logits.float(), dim=-1)[:, flat_ids]
+            scores = torch.full((logprobs.shape[0], len(letters)), float("-inf"), device=self.device)
+            scores = scores.scatter_reduce(1, owners.expand_as(logprobs), logprobs, reduce="amax")
+            choices.extend(letters[k] for k in scores.argmax(dim=-1).tolist())
+        return choices
+
+    # --- micro-batching for concurrent async callers -------------------------------------
+
+    def _enqueue(self, kind: str, text: str) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(kind, [])
+        pending.append((text, future))
+        if len(pending) >= self.batch_size:
+            self._flush(kind)
+        elif len(pending) == 1:
+            loop.call_later(self.batch_wait, self._flush, kind)
+        return future
+
+    def _flush(self, kind: str):
+        batch = self._pending.pop(kind, [])
+        if not batch:
+            return
+        if kind == "generate":
+            fn = self.generate
+        else:
+            # "score:<letters>": every batch shares one letter set
+            fn = functools.partial(self.score_letters, letters=kind.split(":", 1)[1])
+        done = asyncio.get_running_loop().run_in_executor(self._executor, fn, [text for text, _ in batch])
+
+        def resolve(task):
+            error = task.exception()
+            for i, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(task.result()[i])
+
+        done.add_done_callback(resolve)
+
+    async def ascore_letters(self, prompt_value, letters: str = "ABCD") -> str:
+        return await self._enqueue(f"score:{letters}", self.render(prompt_value))
+
+    # --- Runnable interface, so it can replace ChatOpenAI in `prompt | llm | parser` -----
+
+    def invoke(self, input: Any, config=None, **kwargs) -> AIMessage:
+        return AIMessage(content=self.generate([self.render(input)])[0])
+
+    async def ainvoke(self, input: Any, config=None, **kwargs) -> AIMessage:
+        return AIMessage(content=await self._enqueue("generate", self.render(input)))
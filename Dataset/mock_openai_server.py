@@ -0,0 +1,60 @@
+"""
+Minimal OpenAI-compatible chat completions server for exercising the evaluators locally.
+
+    python mock_openai_server.py --port 8000 --delay 0.5 --reply '{"correct_option": "A"}'
+
+Then point ExamAgent at base_url="http://127.0.0.1:8000/v1" with any api_key/model.
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(reply: str, delay: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            time.sleep(delay)
+            prompt_chars = sum(len(str(m.get("content", ""))) for m in request.get("messages", []))
+            body = json.dumps({
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_chars // 4,
+                    "completion_tokens": len(reply) // 4,
+                    "total_tokens": (prompt_chars + len(reply)) // 4,
+                },
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds to sleep before each reply")
+    parser.add_argument("--reply", default='{"correct_option": "A"}', help="assistant message content")
+    args = parser.parse_args()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args.reply, args.delay))
+    print(f"Mock OpenAI server listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
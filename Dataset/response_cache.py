@@ -0,0 +1,114 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Optional
+
+
+class CacheMiss(KeyError):
+    """Raised in replay mode when a prompt has no cached response."""
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of raw LLM responses keyed on (model, temperature, rendered prompt).
+    `max_entries` bounds the cache with LRU eviction; `replay=True` opens it read-only and
+    turns every miss into a CacheMiss instead of an API call.
+    """
+
+    def __init__(self, path: str, max_entries: Optional[int] = None, replay: bool = False):
+        self.path = path
+        self.max_entries = max_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        if replay:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Replay cache '{path}' not found.")
+            self.conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            self.conn = sqlite3.connect(path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, temperature REAL, response TEXT, last_used REAL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self.conn.commit()
+        self.size = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, temperature: Optional[float], prompt: str) -> str:
+        h = hashlib.sha256()
+        for part in (model or "", repr(temperature), prompt):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if not self.replay and self.max_entries is not None:
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, model: str, temperature: Optional[float], response: str):
+        if self.replay:
+            return
+        exists = self.conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, temperature, response, last_used) VALUES (?, ?, ?, ?, ?)",
+            (key, model, temperature, response, time.time()),
+        )
+        if not exists:
+            self.size += 1
+        if self.max_entries is not None and self.size > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (self.size - self.max_entries,),
+            )
+            self.size = self.max_entries
+        self.conn.commit()
+
+    def close(self):
+        if not self.replay:
+            self.conn.commit()
+        self.conn.close()
+
+
+def cached_llm(llm, cache: ResponseCache):
+    """
+    Wraps a chat model as a runnable that returns the response text, answering from `cache`
+    when possible. Use it in place of the bare model: prompt | cached_llm(llm, cache) | parser.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    model = getattr(llm, "model_name", "") or ""
+    temperature = getattr(llm, "temperature", None)
+
+    def lookup(prompt_value):
+        key = cache.make_key(model, temperature, prompt_value.to_string())
+        text = cache.get(key)
+        if text is None and cache.replay:
+            raise CacheMiss(f"no cached response for prompt {key[:12]} (replay mode)")
+        return key, text
+
+    def invoke(prompt_value):
+        key, text = lookup(prompt_value)
+        if text is None:
+            text = llm.invoke(prompt_value).content
+            cache.put(key, model, temperature, text)
+        return text
+
+    async def ainvoke(prompt_value):
+        key, text = lookup(prompt_value)
+        if text is None:
+            text = (await llm.ainvoke(prompt_value)).content
+            cache.put(key, model, temperature, text)
+        return text
+
+    return RunnableLambda(invoke, afunc=ainvoke)
@@ -0,0 +1,78 @@
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, Set
+
+
+def iter_results(path: str) -> Iterator[Dict[str, Any]]:
+    """Streams records from a JSONL results file, skipping a torn last line left by a crash."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_done_ids(path: str) -> Set[str]:
+    return {record["id"] for record in iter_results(path)}
+
+
+class ResultsWriter:
+    """
+    Appends one JSON record per line to a results file. Every record is flushed to the OS
+    immediately; fsync runs every `fsync_every` records or `fsync_interval` seconds.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 64, fsync_interval: float = 5.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._drop_torn_tail()
+        self.f = open(path, "a")
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def _drop_torn_tail(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+
+    def append(self, record: Dict[str, Any]):
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.pending += 1
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.f.closed:
+            self.sync()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
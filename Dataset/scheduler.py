@@ -0,0 +1,155 @@
+"""
+Runs a (model x dataset file x item) evaluation matrix from one work queue into one combined
+results file. Every model endpoint has its own worker pool, rate limit and timeout, so a slow
+endpoint never holds up a fast one. Re-running resumes from the results file.
+
+    python scheduler.py
+"""
+import asyncio
+import json
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import tqdm
+
+import Eval_CA
+import Eval_SU
+from dataset_index import IndexedDataset
+from eval_engine import TokenBucket
+from response_cache import ResponseCache
+from results_store import ResultsWriter, iter_results
+
+# One entry per endpoint; concurrency/rate_limit/timeout apply to that endpoint only
+MODELS: List[Dict[str, Any]] = [
+    # {"name": "gpt-4o", "base_url": "", "api_key": "", "model": "gpt-4o", "temperature": 0.1,
+    #  "concurrency": 32, "rate_limit": None, "timeout": 120.0},
+]
+# dataset file -> evaluator module
+DATASETS = {
+    "./Syntax_Understanding.json": "SU",
+    "./Contextual_Application.json": "CA",
+}
+EVALUATORS = {"SU": Eval_SU, "CA": Eval_CA}
+
+RESULTS_PATH = "./results/matrix.results.jsonl"
+CACHE_PATH = "./llm_cache.sqlite"  # shared by all models; the key includes the model name
+SLIM_PROMPT = False
+
+
+def make_agent(evaluator, model_cfg: Dict[str, Any], cache: Optional[ResponseCache]):
+    return evaluator.ExamAgent(
+        temperature=model_cfg.get("temperature", 0.1),
+        base_url=model_cfg.get("base_url", ""),
+        api_key=model_cfg.get("api_key", ""),
+        model=model_cfg.get("model", ""),
+        max_connections=model_cfg.get("concurrency", 16),
+        cache=cache,
+        slim_prompt=SLIM_PROMPT,
+    )
+
+
+async def run_matrix(
+    models: List[Dict[str, Any]],
+    datasets: Dict[str, str],
+    results_path: str,
+    cache: Optional[ResponseCache] = None,
+) -> int:
+    """Answers every (model, file, item) not yet in `results_path`. Returns the number answered."""
+    done = {}
+    for r in iter_results(results_path):
+        done.setdefault((r["model"], r["file"]), set()).add(r["id"])
+    data = {file: IndexedDataset(file) for file in datasets}
+
+    queues = {}
+    agents = []
+    for model_cfg in models:
+        queue = deque()
+        for file, kind in datasets.items():
+            agent = make_agent(EVALUATORS[kind], model_cfg, cache)
+            agents.append(agent)
+            todo = data[file].exclude_ids(done.get((model_cfg["name"], file), ()))
+            # records are parsed from the memory-mapped dataset only when a worker picks them up
+            queue.extend((file, kind, agent, todo, i) for i in range(len(todo)))
+        queues[model_cfg["name"]] = queue
+
+    progress = tqdm.tqdm(total=sum(len(q) for q in queues.values()))
+    answered = 0
+
+    with ResultsWriter(results_path) as writer:
+        async def worker(model_cfg, queue, bucket):
+            nonlocal answered
+            timeout = model_cfg.get("timeout", 120.0)
+            while queue:
+                file, kind, agent, todo, i = queue.popleft()
+                item = todo[i]
+                if bucket is not None:
+                    await bucket.acquire()
+                try:
+                    result = await asyncio.wait_for(agent.asolve_item(item), timeout)
+                except asyncio.TimeoutError:
+                    print(f"Error during inference ({model_cfg['name']}): request timed out after {timeout}s")
+                    result = None
+                except Exception as e:
+                    print(f"Error during inference ({model_cfg['name']}): {e}")
+                    result = None
+                progress.update(1)
+                if result is not None:
+                    writer.append({"model": model_cfg["name"], "file": file, **EVALUATORS[kind].make_record(item, result)})
+                    answered += 1
+
+        workers = []
+        for model_cfg in models:
+            queue = queues[model_cfg["name"]]
+            bucket = TokenBucket(model_cfg["rate_limit"]) if model_cfg.get("rate_limit") else None
+            workers.extend(worker(model_cfg, queue, bucket) for _ in range(model_cfg.get("concurrency", 16)))
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for agent in agents:
+                if agent.http_async_client is not None:
+                    await agent.http_async_client.aclose()
+                    agent.http_client.close()
+            for dataset in data.values():
+                dataset.close()
+    progress.close()
+    return answered
+
+
+def summarize(results_path: str, datasets: Dict[str, str]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """{model: {file: metrics}} with the same metrics as the per-script `data1` dicts."""
+    from scoring import encode_labels, exact_match, exact_match_by, score_by
+
+    columns = {kind: {"answer": [], "prediction": [], "key": []} for kind in EVALUATORS}
+    for record in iter_results(results_path):
+        kind = datasets.get(record["file"])
+        if kind is None:
+            continue
+        column = columns[kind]
+        column["answer"].append(record["answer"])
+        column["prediction"].append(record["prediction"])
+        column["key"].append(json.dumps([record["model"], record["file"]]))
+
+    summary: Dict[str, Dict[str, Dict[str, float]]] = {}
+    su, ca = columns["SU"], columns["CA"]
+    if su["key"]:
+        by_key = score_by(encode_labels(su["answer"]), encode_labels(su["prediction"]), su["key"])
+        for key, m in by_key.items():
+            model, file = json.loads(key)
+            summary.setdefault(model, {})[file] = {k: m[k] for k in ("acc", "p_macro", "r_macro", "f1_macro")}
+    if ca["key"]:
+        by_key = exact_match_by(exact_match(ca["answer"], ca["prediction"]), ca["key"])
+        for key, m in by_key.items():
+            model, file = json.loads(key)
+            # Eval_CA reports the number of exact matches as "acc"
+            summary.setdefault(model, {})[file] = {"acc": m["correct"]}
+    return summary
+
+
+if __name__ == "__main__":
+    if not MODELS:
+        raise SystemExit("Configure at least one endpoint in MODELS.")
+    cache = ResponseCache(CACHE_PATH) if CACHE_PATH else None
+    asyncio.run(run_matrix(MODELS, DATASETS, RESULTS_PATH, cache))
+    if cache is not None:
+        cache.close()
+    print(json.dumps(summarize(RESULTS_PATH, DATASETS), indent=2))
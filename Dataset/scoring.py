@@ -0,0 +1,167 @@
+"""
+Vectorized scoring for evaluator results. Labels are encoded once into small integer arrays,
+and every metric is derived from (grouped) confusion matrices built with a single bincount,
+so scoring scales to millions of predictions across many models and question types. The
+results_* functions stream a results file and never hold more than one chunk of it.
+"""
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from results_store import iter_results
+
+OPTION_LABELS = ("A", "B", "C", "D")
+CHUNK_SIZE = 1 << 16  # records encoded per bincount when streaming a results file
+
+
+def encode_labels(labels: Iterable[str], classes: Sequence[str] = OPTION_LABELS) -> np.ndarray:
+    codes = {c: i for i, c in enumerate(classes)}
+    try:
+        return np.fromiter((codes[label] for label in labels), dtype=np.int8)
+    except KeyError as e:
+        raise ValueError(f"Unknown label {e.args[0]!r}; expected one of {list(classes)}") from None
+
+
+def encode_groups(keys: Iterable) -> Tuple[np.ndarray, List]:
+    """Maps arbitrary group keys (question type, model name, ...) to dense int ids."""
+    names, ids = np.unique(np.asarray(list(keys), dtype=object).astype(str), return_inverse=True)
+    return ids.astype(np.int64), [str(name) for name in names]
+
+
+def confusion_matrices(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    n_classes: int = len(OPTION_LABELS),
+    groups: Optional[np.ndarray] = None,
+    n_groups: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Confusion matrices (rows = true label, columns = prediction). Without `groups` the result
+    has shape (K, K); with integer `groups` it has shape (G, K, K), one matrix per group.
+    """
+    y_true = np.asarray(y_true, dtype=np.int64)
+    y_pred = np.asarray(y_pred, dtype=np.int64)
+    flat = y_true * n_classes + y_pred
+    if groups is None:
+        return np.bincount(flat, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+    groups = np.asarray(groups, dtype=np.int64)
+    if n_groups is None:
+        n_groups = int(groups.max()) + 1 if groups.size else 0
+    flat += groups * (n_classes * n_classes)
+    return np.bincount(flat, minlength=n_groups * n_classes * n_classes).reshape(n_groups, n_classes, n_classes)
+
+
+def metrics_from_confusion(cm: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Accuracy and macro precision/recall/F1 from confusion matrices of shape (..., K, K).
+    Matches sklearn's average='macro', zero_division=0: the macro average runs over the
+    labels that occur in either y_true or y_pred of that matrix.
+    """
+    cm = np.asarray(cm, dtype=np.float64)
+    tp = np.diagonal(cm, axis1=-2, axis2=-1)
+    true_count = cm.sum(axis=-1)
+    pred_count = cm.sum(axis=-2)
+    total = true_count.sum(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(pred_count > 0, tp / pred_count, 0.0)
+        recall = np.where(true_count > 0, tp / true_count, 0.0)
+        denom = true_count + pred_count
+        f1 = np.where(denom > 0, 2 * tp / denom, 0.0)
+        present = (true_count + pred_count) > 0
+        n_present = present.sum(axis=-1)
+        safe_n = np.maximum(n_present, 1)
+        return {
+            "acc": np.where(total > 0, tp.sum(axis=-1) / np.maximum(total, 1), 0.0),
+            "p_macro": np.where(present, precision, 0.0).sum(axis=-1) / safe_n,
+            "r_macro": np.where(present, recall, 0.0).sum(axis=-1) / safe_n,
+            "f1_macro": np.where(present, f1, 0.0).sum(axis=-1) / safe_n,
+            "n": total.astype(np.int64),
+        }
+
+
+def score(y_true: np.ndarray, y_pred: np.ndarray, n_classes: int = len(OPTION_LABELS)) -> Dict[str, float]:
+    cm = confusion_matrices(y_true, y_pred, n_classes)
+    metrics = {k: v.item() for k, v in metrics_from_confusion(cm).items()}
+    metrics["confusion"] = cm
+    return metrics
+
+
+def score_by(y_true: np.ndarray, y_pred: np.ndarray, keys: Iterable, n_classes: int = len(OPTION_LABELS)) -> Dict[str, Dict[str, float]]:
+    """Per-group metrics (e.g. per question `type`, or per (model, type) pair) in one pass."""
+    groups, names = encode_groups(keys)
+    metrics = metrics_from_confusion(confusion_matrices(y_true, y_pred, n_classes, groups, len(names)))
+    return {name: {k: v[i].item() for k, v in metrics.items()} for i, name in enumerate(names)}
+
+
+def results_confusion(path: str, classes: Sequence[str] = OPTION_LABELS, by: Optional[str] = None, chunk_size: int = CHUNK_SIZE):
+    """
+    Streams a results file into confusion matrices, `chunk_size` records at a time, so memory
+    stays bounded by the chunk. Returns one (K, K) matrix, or with `by` (e.g. "type") a
+    (G, K, K) array plus the list of group names in first-seen order.
+    """
+    n_classes = len(classes)
+    cm = np.zeros((n_classes, n_classes) if by is None else (0, n_classes, n_classes), dtype=np.int64)
+    group_ids: Dict[str, int] = {}
+    records = iter_results(path)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        y_true = encode_labels((r["answer"] for r in chunk), classes)
+        y_pred = encode_labels((r["prediction"] for r in chunk), classes)
+        if by is None:
+            cm += confusion_matrices(y_true, y_pred, n_classes)
+            continue
+        groups = np.fromiter((group_ids.setdefault(str(r.get(by)), len(group_ids)) for r in chunk), dtype=np.int64, count=len(chunk))
+        if len(group_ids) > len(cm):
+            cm = np.concatenate([cm, np.zeros((len(group_ids) - len(cm), n_classes, n_classes), dtype=np.int64)])
+        cm += confusion_matrices(y_true, y_pred, n_classes, groups, len(group_ids))
+    if by is None:
+        return cm
+    return cm, list(group_ids)
+
+
+def score_results(path: str, classes: Sequence[str] = OPTION_LABELS) -> Dict[str, float]:
+    cm = results_confusion(path, classes)
+    metrics = {k: v.item() for k, v in metrics_from_confusion(cm).items()}
+    metrics["confusion"] = cm
+    return metrics
+
+
+def score_results_by(path: str, by: str = "type", classes: Sequence[str] = OPTION_LABELS) -> Dict[str, Dict[str, float]]:
+    cm, names = results_confusion(path, classes, by=by)
+    metrics = metrics_from_confusion(cm)
+    return {name: {k: v[i].item() for k, v in metrics.items()} for i, name in enumerate(names)}
+
+
+def exact_match(ground_truths: Sequence, predictions: Sequence) -> np.ndarray:
+    """Boolean array of whitespace-stripped exact matches (answers may be numbers in the dataset)."""
+    gt = np.char.strip(np.asarray([str(x) for x in ground_truths], dtype=str))
+    pred = np.char.strip(np.asarray([str(x) for x in predictions], dtype=str))
+    return gt == pred
+
+
+def exact_match_by(matches: np.ndarray, keys: Iterable) -> Dict[str, Dict[str, float]]:
+    groups, names = encode_groups(keys)
+    correct = np.bincount(groups, weights=matches, minlength=len(names))
+    total = np.bincount(groups, minlength=len(names))
+    return {name: {"correct": int(correct[i]), "n": int(total[i]), "acc": float(correct[i] / total[i])} for i, name in enumerate(names)}
+
+
+def results_exact_match(path: str, by: Optional[str] = None):
+    """
+    Streams a results file and counts whitespace-stripped exact matches record by record.
+    Returns (correct, n), or with `by` a {group: {"correct", "n", "acc"}} dict.
+    """
+    correct: Dict[str, int] = {}
+    total: Dict[str, int] = {}
+    for record in iter_results(path):
+        key = str(record.get(by)) if by is not None else ""
+        total[key] = total.get(key, 0) + 1
+        if str(record["answer"]).strip() == str(record["prediction"]).strip():
+            correct[key] = correct.get(key, 0) + 1
+    if by is None:
+        return correct.get("", 0), total.get("", 0)
+    return {key: {"correct": correct.get(key, 0), "n": n, "acc": correct.get(key, 0) / n} for key, n in total.items()}
@@ -0,0 +1,24 @@
+from typing import Literal
+
+import pytest
+from pydantic import BaseModel
+
+from answer_extract import AnswerExtractor
+
+
+class QuestionAnswer(BaseModel):
+    correct_option: Literal["A", "B", "C", "D"]
+
+
+@pytest.mark.parametrize("reply, expected", [
+    ('{"correct_option": "C"}', "C"),
+    ("B", "B"),
+    ("The answer is B because option D is wrong.", "B"),
+    ("Answer: (A). Option C is a distractor.", "A"),
+    ("The answer is option C.", "C"),
+    ("Option A is wrong, so I pick option D.", "D"),
+])
+def test_correct_option(reply, expected):
+    extractor = AnswerExtractor(QuestionAnswer, "correct_option")
+    assert extractor(reply).correct_option == expected
+    assert extractor.stats.fast == 1
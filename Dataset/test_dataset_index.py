@@ -0,0 +1,52 @@
+import json
+import os
+import pickle
+
+import pytest
+
+from dataset_index import IndexedDataset
+
+
+@pytest.fixture
+def dataset_path(tmp_path):
+    records = [{"id": f"q{i}", "type": "single" if i % 2 else "multi", "tool_name": f"tool{i % 3}", "question": f"Q{i}"} for i in range(10)]
+    path = tmp_path / "bench.json"
+    path.write_text(json.dumps(records))
+    return str(path)
+
+
+def test_build_and_reopen(dataset_path):
+    with IndexedDataset(dataset_path) as data:
+        assert len(data) == 10
+        assert data[3]["question"] == "Q3"
+        assert data.get("q7")["tool_name"] == "tool1"
+    jsonl_mtime = os.stat(dataset_path.replace(".json", ".jsonl")).st_mtime_ns
+
+    with IndexedDataset(dataset_path) as data:
+        assert [r["id"] for r in data] == [f"q{i}" for i in range(10)]
+    assert os.stat(dataset_path.replace(".json", ".jsonl")).st_mtime_ns == jsonl_mtime  # reused, not rebuilt
+
+
+def test_rebuilds_when_source_changes(dataset_path):
+    IndexedDataset(dataset_path).close()
+    with open(dataset_path, "w") as f:
+        json.dump([{"id": "new", "question": "changed"}], f)
+    with IndexedDataset(dataset_path) as data:
+        assert data.ids == ["new"]
+
+
+@pytest.mark.parametrize("num_shards", [1, 3, 4, 10, 12])
+def test_shards_cover_everything_in_order(dataset_path, num_shards):
+    with IndexedDataset(dataset_path) as data:
+        shards = [data.shard(num_shards, i) for i in range(num_shards)]
+        assert sum((s.ids for s in shards), []) == data.ids
+        assert max(len(s) for s in shards) - min(len(s) for s in shards) <= 1
+
+
+def test_filter_and_exclude_ids(dataset_path):
+    with IndexedDataset(dataset_path) as data:
+        view = data.filter(type="single").exclude_ids({"q1", "q5", "absent"})
+        assert view.ids == ["q3", "q7", "q9"]
+        assert data.filter(type="multi", tool_name="tool0").ids == ["q0", "q6"]
+        shard = pickle.loads(pickle.dumps(view.shard(2, 1)))
+        assert [r["id"] for r in shard] == ["q9"]
@@ -0,0 +1,37 @@
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_hit_and_miss(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    key = cache.make_key("gpt", 0.0, "prompt")
+    assert cache.get(key) is None
+    cache.put(key, "gpt", 0.0, "answer")
+    assert cache.get(key) == "answer"
+    assert cache.get(cache.make_key("gpt", 0.7, "prompt")) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path / "cache.sqlite"), replay=True)
+    assert reopened.get(key) == "answer"
+    reopened.close()
+
+
+def test_lru_eviction(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("response_cache.time.time", lambda: next(clock))
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"), max_entries=2)
+    cache.put("a", "m", None, "1")
+    cache.put("b", "m", None, "2")
+    assert cache.get("a") == "1"  # "b" is now the least recently used
+    cache.put("c", "m", None, "3")
+    assert cache.size == 2
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    cache.close()
+
+
+def test_replay_needs_existing_cache(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        ResponseCache(str(tmp_path / "missing.sqlite"), replay=True)
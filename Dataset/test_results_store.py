@@ -0,0 +1,33 @@
+import json
+
+from results_store import ResultsWriter, iter_results, read_done_ids
+
+
+def test_append_and_resume(tmp_path):
+    path = str(tmp_path / "out" / "results.jsonl")
+    with ResultsWriter(path) as writer:
+        writer.append({"id": "a", "prediction": "A"})
+        writer.append({"id": "b", "prediction": "B"})
+    with ResultsWriter(path) as writer:
+        writer.append({"id": "c", "prediction": "C"})
+    assert [r["id"] for r in iter_results(path)] == ["a", "b", "c"]
+    assert read_done_ids(str(tmp_path / "missing.jsonl")) == set()
+
+
+def test_torn_tail_recovery(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({"id": "a"}) + "\n" + '{"id": "b", "predic')  # crash mid-write
+    assert read_done_ids(str(path)) == {"a"}
+
+    with ResultsWriter(str(path)) as writer:
+        writer.append({"id": "b"})
+    assert path.read_text() == '{"id": "a"}\n{"id": "b"}\n'
+    assert read_done_ids(str(path)) == {"a", "b"}
+
+
+def test_torn_first_line(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text('{"id": ')
+    with ResultsWriter(str(path)) as writer:
+        writer.append({"id": "a"})
+    assert [r["id"] for r in iter_results(str(path))] == ["a"]
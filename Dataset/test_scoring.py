@@ -0,0 +1,71 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support
+
+from scoring import OPTION_LABELS, encode_labels, results_confusion, score, score_by, score_results, score_results_by
+
+
+def sklearn_metrics(y_true, y_pred):
+    p, r, f1, _ = precision_recall_fscore_support(y_true, y_pred, average="macro", zero_division=0)
+    return {"acc": accuracy_score(y_true, y_pred), "p_macro": p, "r_macro": r, "f1_macro": f1}
+
+
+def random_labels(seed, n, predicted=OPTION_LABELS):
+    rng = np.random.default_rng(seed)
+    return list(rng.choice(OPTION_LABELS, n)), list(rng.choice(predicted, n))
+
+
+@pytest.mark.parametrize("seed, n, predicted", [
+    (0, 1, OPTION_LABELS),
+    (1, 50, OPTION_LABELS),
+    (2, 1000, OPTION_LABELS),
+    (3, 200, ("A", "B")),  # labels missing from y_pred drop out of sklearn's macro average
+])
+def test_score_matches_sklearn(seed, n, predicted):
+    y_true, y_pred = random_labels(seed, n, predicted)
+    metrics = score(encode_labels(y_true), encode_labels(y_pred))
+    for name, expected in sklearn_metrics(y_true, y_pred).items():
+        assert metrics[name] == pytest.approx(expected)
+    assert metrics["n"] == n
+    assert (metrics["confusion"] == confusion_matrix(y_true, y_pred, labels=list(OPTION_LABELS))).all()
+
+
+def test_score_empty():
+    metrics = score(encode_labels([]), encode_labels([]))
+    assert (metrics["acc"], metrics["p_macro"], metrics["r_macro"], metrics["f1_macro"], metrics["n"]) == (0, 0, 0, 0, 0)
+
+
+def test_score_by_matches_sklearn_per_group():
+    y_true, y_pred = random_labels(4, 500)
+    types = np.random.default_rng(5).choice(["single", "multi", "code"], 500)
+    by_type = score_by(encode_labels(y_true), encode_labels(y_pred), types)
+    assert sorted(by_type) == ["code", "multi", "single"]
+    for name, metrics in by_type.items():
+        mask = types == name
+        expected = sklearn_metrics(np.array(y_true)[mask], np.array(y_pred)[mask])
+        for key, value in expected.items():
+            assert metrics[key] == pytest.approx(value)
+
+
+def test_results_confusion_streams_in_chunks(tmp_path):
+    y_true, y_pred = random_labels(6, 301)
+    types = ["a" if i % 3 else "b" for i in range(301)]
+    path = tmp_path / "results.jsonl"
+    path.write_text("".join(
+        json.dumps({"id": str(i), "type": t, "answer": a, "prediction": p}) + "\n"
+        for i, (a, p, t) in enumerate(zip(y_true, y_pred, types))
+    ))
+    expected = confusion_matrix(y_true, y_pred, labels=list(OPTION_LABELS))
+    assert (results_confusion(str(path), chunk_size=16) == expected).all()
+
+    by_type, names = results_confusion(str(path), by="type", chunk_size=16)
+    assert names == ["b", "a"]
+    for cm, name in zip(by_type, names):
+        mask = np.array(types) == name
+        assert (cm == confusion_matrix(np.array(y_true)[mask], np.array(y_pred)[mask], labels=list(OPTION_LABELS))).all()
+
+    assert score_results(str(path))["f1_macro"] == pytest.approx(sklearn_metrics(y_true, y_pred)["f1_macro"])
+    assert score_results_by(str(path))["b"]["n"] == 101
+    assert score_results(str(tmp_path / "missing.jsonl"))["n"] == 0